@@ -0,0 +1,147 @@
+# Gerenciamento do contexto enviado ao Gemini em cada mensagem.
+#
+# O histórico completo da sessão continua guardado, mas o modelo recebe apenas
+# um resumo acumulado das trocas antigas e as últimas N trocas na íntegra,
+# limitadas por um orçamento de tokens. Assim o tamanho do payload fica estável
+# mesmo em sessões de estudo longas. O resumo é atualizado fora do caminho da
+# requisição (ver summary_refresh_due e refresh_summary); falhas são registradas
+# no próprio estado do resumo e as novas tentativas seguem um backoff exponencial.
+import os
+import time
+
+from observability import log_error
+
+# Número de trocas (pergunta do aluno + resposta do tutor) enviadas na íntegra
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "6"))
+# Orçamento aproximado de tokens para o histórico (resumo + trocas recentes)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Quantas trocas antigas precisam acumular antes de atualizar o resumo
+CONTEXT_SUMMARY_BATCH_TURNS = int(os.getenv("CONTEXT_SUMMARY_BATCH_TURNS", "4"))
+# Espera após uma falha ao resumir, dobrando a cada falha seguida até o teto
+CONTEXT_SUMMARY_RETRY_SECONDS = float(os.getenv("CONTEXT_SUMMARY_RETRY_SECONDS", "30"))
+CONTEXT_SUMMARY_RETRY_MAX_SECONDS = float(os.getenv("CONTEXT_SUMMARY_RETRY_MAX_SECONDS", "600"))
+# Threads dedicadas às atualizações de resumo em segundo plano
+CONTEXT_SUMMARY_WORKERS = int(os.getenv("CONTEXT_SUMMARY_WORKERS", "2"))
+
+SUMMARY_ACK = "Entendido. Vou considerar esse resumo da nossa conversa nas próximas respostas."
+
+
+def estimate_tokens(text):
+    """Estimativa simples de tokens (~4 caracteres por token), suficiente para orçamento."""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def message_text(message):
+    """Extrai o texto de uma mensagem no formato de histórico do Gemini."""
+    return "".join(part.get("text", "") for part in message.get("parts", []))
+
+
+def history_tokens(messages):
+    return sum(estimate_tokens(message_text(m)) for m in messages)
+
+
+def new_summary_state():
+    """Estado inicial do resumo de uma sessão.
+
+    text e covered são o resumo e quantas mensagens ele cobre; failures e
+    retryAt (timestamp) controlam o backoff depois de falhas ao resumir.
+    """
+    return {"text": "", "covered": 0, "failures": 0, "retryAt": 0}
+
+
+def _current_state(history, summary_state):
+    state = new_summary_state()
+    state.update(summary_state or {})
+    # Histórico foi reiniciado ou truncado: o resumo antigo deixa de valer
+    if state["covered"] > len(history):
+        state = new_summary_state()
+    return state
+
+
+def summary_refresh_due(history, summary_state, now=None, max_turns=None, batch_turns=None):
+    """Índice do histórico até onde o resumo deve passar a cobrir, ou None se não for hora de atualizar.
+
+    Só há atualização quando pelo menos `batch_turns` trocas saíram da janela
+    enviada na íntegra e ainda não foram resumidas, e nunca antes de retryAt.
+    """
+    max_turns = CONTEXT_MAX_TURNS if max_turns is None else max_turns
+    batch_turns = CONTEXT_SUMMARY_BATCH_TURNS if batch_turns is None else batch_turns
+    state = _current_state(history, summary_state)
+    if state["retryAt"] > (time.time() if now is None else now):
+        return None
+    # O histórico é sempre gravado em pares (user, model)
+    window_start = max(0, len(history) // 2 - max_turns) * 2
+    if window_start - state["covered"] < batch_turns * 2:
+        return None
+    return window_start
+
+
+def refresh_summary(history, summary_state, summarize_fn, end, now=None):
+    """Incorpora history[covered:end] ao resumo e retorna o novo estado.
+
+    Apenas as trocas ainda não resumidas são enviadas ao `summarize_fn`, junto
+    com o resumo anterior. Se ele falhar, o resumo é mantido e a próxima
+    tentativa é adiada com backoff exponencial.
+    """
+    state = _current_state(history, summary_state)
+    try:
+        text = summarize_fn(state["text"], history[state["covered"]:end])
+    except Exception as e:
+        failures = state["failures"] + 1
+        delay = min(CONTEXT_SUMMARY_RETRY_MAX_SECONDS, CONTEXT_SUMMARY_RETRY_SECONDS * 2 ** (failures - 1))
+        log_error("summary_failed", e, failures=failures, retryInSeconds=delay)
+        state.update(failures=failures, retryAt=(time.time() if now is None else now) + delay)
+        return state
+    return {"text": text, "covered": end, "failures": 0, "retryAt": 0}
+
+
+def build_context(history, summary_state, token_budget=None):
+    """Monta o histórico limitado que será enviado ao modelo.
+
+    Retorna (contexto, estatísticas). Usa o resumo como está: trocas fora da
+    janela que ainda não foram resumidas seguem na íntegra, limitadas pelo
+    orçamento de tokens.
+    """
+    token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    state = _current_state(history, summary_state)
+    total_turns = len(history) // 2
+
+    summary_tokens = estimate_tokens(state["text"])
+    verbatim = history[state["covered"]:]
+    verbatim_tokens = history_tokens(verbatim)
+
+    # Descarta as trocas mais antigas até caber no orçamento, mantendo sempre a última
+    while len(verbatim) > 2 and summary_tokens + verbatim_tokens > token_budget:
+        verbatim_tokens -= history_tokens(verbatim[:2])
+        verbatim = verbatim[2:]
+
+    context = []
+    if state["text"]:
+        context.append({"role": "user", "parts": [{"text": f"Resumo da conversa até agora: {state['text']}"}]})
+        context.append({"role": "model", "parts": [{"text": SUMMARY_ACK}]})
+    context.extend(verbatim)
+
+    stats = {
+        "turnsTotal": total_turns,
+        "turnsSent": len(verbatim) // 2,
+        "summarizedTurns": state["covered"] // 2,
+        "estimatedTokens": summary_tokens + verbatim_tokens,
+    }
+    return context, stats
+
+
+def summary_prompt(previous_summary, messages):
+    """Prompt usada para incorporar novas trocas ao resumo acumulado."""
+    transcript = "\n".join(
+        f"{'Aluno' if m.get('role') == 'user' else 'Tutor'}: {message_text(m)}" for m in messages
+    )
+    return (
+        "Você mantém um resumo curto de uma sessão de tutoria de HTML e CSS. "
+        "Atualize o resumo abaixo incorporando as novas trocas, preservando os conceitos já explicados, "
+        "exercícios propostos, dúvidas e dificuldades do aluno. Responda apenas com o resumo, "
+        "em no máximo 150 palavras.\n\n"
+        f"Resumo atual: {previous_summary or '(vazio)'}\n\n"
+        f"Novas trocas:\n{transcript}"
+    )
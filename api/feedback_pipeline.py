@@ -0,0 +1,217 @@
+# Ingestão de feedback (like/dislike) em lote.
+#
+# O endpoint /api/feedback apenas enfileira o evento em memória. Uma thread em
+# segundo plano grava os eventos em lote no SQLite, quando o lote atinge
+# FEEDBACK_BATCH_SIZE ou a cada FEEDBACK_FLUSH_INTERVAL_SECONDS, e também no
+# encerramento do processo. Junto com os eventos brutos, o mesmo lote atualiza
+# uma tabela de contadores pré-agregados por tópico, modo e hora, usada pelo
+# endpoint /api/feedback/stats sem precisar reler todos os eventos. Se a gravação
+# falhar, o lote fica retido em memória e volta a ser gravado no próximo ciclo.
+import atexit
+import datetime
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from observability import log_error, log_event
+
+FEEDBACK_DB_PATH = os.getenv("FEEDBACK_DB_PATH", os.path.join(tempfile.gettempdir(), "tutor_feedback.db"))
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "50"))
+FEEDBACK_FLUSH_INTERVAL_SECONDS = float(os.getenv("FEEDBACK_FLUSH_INTERVAL_SECONDS", "2"))
+FEEDBACK_QUEUE_MAX = int(os.getenv("FEEDBACK_QUEUE_MAX", "10000"))
+
+FEEDBACK_TYPES = ("like", "dislike")
+UNKNOWN = "desconhecido"
+
+
+def hour_bucket(timestamp):
+    return timestamp.strftime("%Y-%m-%dT%H:00")
+
+
+class FeedbackPipeline:
+    def __init__(self, db_path=FEEDBACK_DB_PATH, batch_size=FEEDBACK_BATCH_SIZE,
+                 flush_interval=FEEDBACK_FLUSH_INTERVAL_SECONDS, max_queue=FEEDBACK_QUEUE_MAX):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Protege a fila e os contadores ainda não gravados; só é mantido por instantes,
+        # para que /api/feedback nunca espere pelo disco
+        self._lock = threading.Lock()
+        # Protege a conexão SQLite. Ordem de aquisição: _db_lock antes de _lock
+        self._db_lock = threading.Lock()
+        # Contagens de eventos enfileirados mas ainda não gravados: (tópico, modo, hora, tipo) -> n
+        self._pending_counts = Counter()
+        # Eventos já retirados da fila e ainda não gravados (inclusive lotes que falharam)
+        self._held = []
+        self._failing = False
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback_events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " created TEXT NOT NULL,"
+                " session_id TEXT,"
+                " message_id TEXT,"
+                " feedback_type TEXT NOT NULL,"
+                " topic TEXT NOT NULL,"
+                " mode TEXT NOT NULL,"
+                " message_text TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback_counts ("
+                " topic TEXT NOT NULL,"
+                " mode TEXT NOT NULL,"
+                " bucket TEXT NOT NULL,"
+                " feedback_type TEXT NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " PRIMARY KEY (topic, mode, bucket, feedback_type))"
+            )
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        # A thread só é criada no primeiro feedback, para não pesar na inicialização
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, session_id, message_id, feedback_type, message_text, topic=None, mode=None):
+        """Enfileira um feedback. Levanta queue.Full se a fila estiver cheia."""
+        now = datetime.datetime.now()
+        event = {
+            "created": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "bucket": hour_bucket(now),
+            "session_id": session_id,
+            "message_id": message_id,
+            "feedback_type": feedback_type,
+            "topic": topic or UNKNOWN,
+            "mode": mode or UNKNOWN,
+            "message_text": (message_text or "").replace("\n", " ").strip(),
+        }
+        self._ensure_worker()
+        with self._lock:
+            self._queue.put_nowait(event)
+            self._pending_counts[(event["topic"], event["mode"], event["bucket"], feedback_type)] += 1
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            try:
+                event = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                with self._write_lock:
+                    self._held.append(event)
+            except queue.Empty:
+                pass
+            # Depois de uma falha, só tenta de novo no próximo intervalo, mesmo com o lote cheio
+            if (len(self._held) >= self.batch_size and not self._failing) or time.monotonic() >= deadline:
+                self._write_held()
+                deadline = time.monotonic() + self.flush_interval
+        # O que sobrar é gravado por close() -> flush()
+
+    def _write_held(self):
+        with self._write_lock:
+            if not self._held:
+                return
+            if self._write(self._held):
+                self._held = []
+                self._failing = False
+                return
+            self._failing = True
+            # Limita a memória retida durante uma falha prolongada, descartando os mais antigos
+            overflow = len(self._held) - self.max_queue
+            if overflow > 0:
+                dropped, self._held = self._held[:overflow], self._held[overflow:]
+                with self._lock:
+                    self._pending_counts.subtract(
+                        Counter((e["topic"], e["mode"], e["bucket"], e["feedback_type"]) for e in dropped)
+                    )
+                    self._pending_counts += Counter()
+                log_event("feedback_dropped", level="warning", reason="write_failures", count=overflow)
+
+    def _write(self, batch):
+        """Grava o lote numa única transação. Retorna False se a gravação falhar."""
+        counts = Counter((e["topic"], e["mode"], e["bucket"], e["feedback_type"]) for e in batch)
+        with self._db_lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO feedback_events"
+                        " (created, session_id, message_id, feedback_type, topic, mode, message_text)"
+                        " VALUES (:created, :session_id, :message_id, :feedback_type, :topic, :mode, :message_text)",
+                        batch,
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO feedback_counts (topic, mode, bucket, feedback_type, count)"
+                        " VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (topic, mode, bucket, feedback_type) DO UPDATE SET count = count + excluded.count",
+                        [key + (n,) for key, n in counts.items()],
+                    )
+            except sqlite3.Error as e:
+                # O lote continua retido (e contado em memória) para a próxima tentativa
+                log_error("feedback_batch_failed", e, batchSize=len(batch))
+                return False
+            # Ainda sob _db_lock, para que stats() nunca veja o lote no banco e também pendente
+            with self._lock:
+                self._pending_counts.subtract(counts)
+                self._pending_counts += Counter()  # remove chaves zeradas
+        log_event("feedback_batch_written", batchSize=len(batch))
+        return True
+
+    def flush(self):
+        """Grava imediatamente tudo o que estiver retido ou na fila (usado no encerramento e em testes)."""
+        with self._write_lock:
+            while True:
+                try:
+                    self._held.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        self._write_held()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self, granularity="hour"):
+        """Contagens de like/dislike por tópico, modo e período (hour ou day)."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT topic, mode, bucket, feedback_type, count FROM feedback_counts"
+            ).fetchall()
+            with self._lock:
+                rows.extend(key + (n,) for key, n in self._pending_counts.items())
+
+        def empty():
+            return {t: 0 for t in FEEDBACK_TYPES}
+
+        totals = empty()
+        by_topic, by_mode, by_bucket = {}, {}, {}
+        for topic, mode, bucket, feedback_type, count in rows:
+            if granularity == "day":
+                bucket = bucket[:10]
+            for group, key in ((by_topic, topic), (by_mode, mode), (by_bucket, bucket)):
+                counts = group.setdefault(key, empty())
+                counts[feedback_type] = counts.get(feedback_type, 0) + count
+            totals[feedback_type] = totals.get(feedback_type, 0) + count
+
+        return {
+            "totals": totals,
+            "byTopic": by_topic,
+            "byMode": by_mode,
+            "byBucket": dict(sorted(by_bucket.items())),
+            "granularity": granularity,
+            "queued": self._queue.qsize() + len(self._held),
+        }
@@ -0,0 +1,298 @@
+# Correção local de exercícios de HTML e CSS, sem chamar o Gemini.
+#
+# Cada tópico da trilha (mesmas chaves de learning_topics.json) tem um conjunto
+# de regras declarativas, compiladas uma vez na inicialização. O código do aluno
+# passa por um parser de HTML em streaming (html.parser, sem montar DOM) e por
+# um parser simples de declarações CSS (blocos <style>, atributos style="" e CSS
+# enviado à parte). Tópicos sem regras são considerados abertos e continuam
+# sendo avaliados pelo tutor via /api/chat.
+import re
+from html.parser import HTMLParser
+
+MAX_SUBMISSION_CHARS = 50000
+
+# Tipos de regra:
+#   element:  pelo menos um dos seletores ("tag", "tag[attr]" ou "tag[attr=valor]") existe
+#   css:      existe uma declaração cuja propriedade (e, opcionalmente, o valor) casa por inteiro com as regex
+#   selector: existe uma regra CSS cujo seletor casa com a regex
+#   media:    existe ao menos uma regra dentro de @media
+# Regras com "required": False só geram dicas e não reprovam o exercício.
+RULE_SETS = {
+    "html_intro": [
+        {"id": "heading", "element": "h1|h2|h3|h4|h5|h6",
+         "hint": "Inclua um título com uma das tags <h1> a <h6>."},
+        {"id": "paragraph", "element": "p",
+         "hint": "Adicione pelo menos um parágrafo com a tag <p>."},
+        {"id": "document", "element": "html|body", "required": False,
+         "hint": "Num documento completo, o conteúdo fica dentro de <html> e <body>."},
+    ],
+    "html_text": [
+        {"id": "list", "element": "ul|ol",
+         "hint": "Crie uma lista com <ul> (não ordenada) ou <ol> (ordenada)."},
+        {"id": "list_item", "element": "li",
+         "hint": "Os itens da lista devem usar a tag <li>."},
+        {"id": "link", "element": "a[href]",
+         "hint": "Adicione um link com <a href=\"...\">."},
+        {"id": "emphasis", "element": "strong|em|b|i|u", "required": False,
+         "hint": "Experimente destacar texto com <strong> ou <em>."},
+    ],
+    "html_media": [
+        {"id": "media", "element": "img[src]|audio|video",
+         "hint": "Incorpore uma mídia: <img src=\"...\">, <audio> ou <video>."},
+        {"id": "img_alt", "element": "img[alt]", "only_if": "img",
+         "hint": "Toda imagem precisa de um texto alternativo no atributo alt."},
+        {"id": "controls", "element": "audio[controls]|video[controls]", "only_if": "audio|video", "required": False,
+         "hint": "Use o atributo controls para que o usuário possa reproduzir áudio e vídeo."},
+    ],
+    "html_forms": [
+        {"id": "form", "element": "form",
+         "hint": "Os campos devem estar dentro de um <form>."},
+        {"id": "field", "element": "input|textarea|select",
+         "hint": "Adicione pelo menos um campo: <input>, <textarea> ou <select>."},
+        {"id": "label", "element": "label",
+         "hint": "Identifique os campos com <label>."},
+        {"id": "submit", "element": "button|input[type=submit]",
+         "hint": "Inclua um botão de envio: <button> ou <input type=\"submit\">."},
+        {"id": "label_for", "element": "label[for]", "only_if": "label", "required": False,
+         "hint": "Ligue o <label> ao campo com o atributo for igual ao id do campo."},
+        {"id": "field_name", "element": "input[name]|textarea[name]|select[name]", "required": False,
+         "hint": "Dê um atributo name aos campos para que os dados sejam enviados."},
+    ],
+    "css_intro": [
+        {"id": "rule", "selector": r".",
+         "hint": "Escreva pelo menos uma regra CSS no formato seletor { propriedade: valor; }."},
+        {"id": "class_or_id", "selector": r"[.#][A-Za-z_-]", "required": False,
+         "hint": "Além de seletores de elemento (p, h1), experimente um de classe (.nome) ou de ID (#nome)."},
+    ],
+    "css_colors_fonts": [
+        {"id": "color", "css": r"color|background-color|background",
+         "hint": "Defina uma cor com color ou background-color."},
+        {"id": "font", "css": r"font-family|font-size|font-weight|font",
+         "hint": "Ajuste a fonte com font-family, font-size ou font-weight."},
+    ],
+    "css_box_model": [
+        {"id": "margin", "css": r"margin(-(top|right|bottom|left))?",
+         "hint": "Use margin para o espaçamento externo."},
+        {"id": "padding", "css": r"padding(-(top|right|bottom|left))?",
+         "hint": "Use padding para o espaçamento interno."},
+        {"id": "border", "css": r"border(-(top|right|bottom|left|width|style|color|radius))?", "required": False,
+         "hint": "Experimente adicionar uma borda com border."},
+        {"id": "box_sizing", "css": r"box-sizing", "required": False,
+         "hint": "box-sizing: border-box facilita o cálculo do tamanho das caixas."},
+    ],
+    "css_flexbox": [
+        {"id": "display_flex", "css": r"display", "value": r"(inline-)?flex",
+         "hint": "O container precisa de display: flex."},
+        {"id": "alignment", "css": r"justify-content|align-items|align-content",
+         "hint": "Alinhe os itens com justify-content ou align-items."},
+        {"id": "direction", "css": r"flex-direction|flex-wrap|flex-flow|gap", "required": False,
+         "hint": "Controle a direção e a quebra com flex-direction e flex-wrap."},
+    ],
+    "css_grid": [
+        {"id": "display_grid", "css": r"display", "value": r"(inline-)?grid",
+         "hint": "O container precisa de display: grid."},
+        {"id": "template", "css": r"grid-template-columns|grid-template-rows|grid-template-areas|grid-template",
+         "hint": "Defina as colunas ou linhas com grid-template-columns ou grid-template-rows."},
+        {"id": "gap", "css": r"gap|row-gap|column-gap|grid-gap", "required": False,
+         "hint": "Use gap para o espaçamento entre as células."},
+    ],
+    "responsive_design": [
+        {"id": "media_query", "media": True,
+         "hint": "Use uma media query, por exemplo @media (max-width: 600px) { ... }."},
+        {"id": "viewport", "element": "meta[name=viewport]", "required": False,
+         "hint": "Inclua <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\"> no <head>."},
+        {"id": "relative_units", "css": r".+", "value": r".*\d(?:%|(?:vw|vh|rem|em|fr)\b).*", "required": False,
+         "hint": "Prefira unidades relativas (%, rem, vw) a larguras fixas em px."},
+    ],
+}
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_BRACE_RE = re.compile(r"[{}]")
+_SELECTOR_RE = re.compile(r"^([a-z][a-z0-9-]*)(?:\[([a-z-]+)(?:=([^\]]+))?\])?$")
+# Atributos que valem só por estarem presentes (os booleanos e alt="", válido em imagens
+# decorativas); nos demais o valor não pode ser vazio
+_PRESENCE_ATTRIBUTES = frozenset({"controls", "autoplay", "loop", "muted", "required", "disabled", "checked", "multiple", "alt"})
+
+
+class CssRule:
+    __slots__ = ("selector", "declarations", "media")
+
+    def __init__(self, selector, declarations, media):
+        self.selector = selector
+        self.declarations = declarations
+        self.media = media
+
+
+def parse_declarations(text):
+    """Converte 'prop: valor; ...' em uma lista de (propriedade, valor) normalizados."""
+    declarations = []
+    for chunk in text.split(";"):
+        prop, sep, value = chunk.partition(":")
+        prop = prop.strip().lower()
+        if not sep or not prop:
+            continue
+        value = value.replace("!important", "").strip().lower()
+        declarations.append((prop, value))
+    return declarations
+
+
+def parse_css(text):
+    """Parser leve de CSS: regras e declarações, registrando as @media em que estão aninhadas."""
+    text = _COMMENT_RE.sub("", text)
+    rules = []
+    stack = []  # prelúdios dos blocos abertos
+    media = []
+    start = 0
+    for match in _BRACE_RE.finditer(text):
+        chunk = text[start:match.start()]
+        start = match.end()
+        if match.group() == "{":
+            # Ignora instruções terminadas em ";" antes do bloco (ex.: @import)
+            prelude = chunk.rsplit(";", 1)[-1].strip()
+            stack.append(prelude)
+            if prelude.lower().startswith("@media"):
+                media.append(prelude)
+        elif stack:
+            prelude = stack.pop()
+            if prelude.lower().startswith("@media"):
+                media.pop()
+            elif not prelude.startswith("@"):
+                rules.append(CssRule(prelude, parse_declarations(chunk), tuple(media)))
+    return rules
+
+
+class SubmissionParser(HTMLParser):
+    """Percorre o HTML em streaming guardando só o necessário para a correção."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.elements = {}  # tag -> lista de dicionários de atributos
+        self.inline_declarations = []
+        self.style_blocks = []
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = {name.lower(): (value or "") for name, value in attrs}
+        self.elements.setdefault(tag, []).append(attributes)
+        if attributes.get("style"):
+            self.inline_declarations.extend(parse_declarations(attributes["style"]))
+        if tag == "style":
+            self._in_style = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == "style":
+            self._in_style = False
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.style_blocks.append(data)
+
+
+class Submission:
+    def __init__(self, code, css=""):
+        parser = SubmissionParser()
+        parser.feed(code or "")
+        parser.close()
+        self.elements = parser.elements
+        self.rules = parse_css("\n".join(parser.style_blocks) + "\n" + (css or ""))
+        self.declarations = list(parser.inline_declarations)
+        for rule in self.rules:
+            self.declarations.extend(rule.declarations)
+
+
+def _compile_selectors(spec):
+    selectors = []
+    for alternative in spec.split("|"):
+        match = _SELECTOR_RE.match(alternative.strip().lower())
+        if match is None:
+            raise ValueError(f"Seletor inválido na regra de correção: '{alternative}'")
+        tag, attr, value = match.groups()
+        selectors.append((tag, attr, value.strip("\"'") if value else None))
+    return tuple(selectors)
+
+
+def _matches_element(submission, selectors):
+    for tag, attr, value in selectors:
+        for attributes in submission.elements.get(tag, ()):
+            if attr is None:
+                return True
+            found = attributes.get(attr)
+            if found is None:
+                continue
+            if value is not None:
+                if found.strip().lower() == value:
+                    return True
+            elif attr in _PRESENCE_ATTRIBUTES or found.strip():
+                return True
+    return False
+
+
+class CompiledCheck:
+    def __init__(self, spec):
+        self.id = spec["id"]
+        self.hint = spec["hint"]
+        self.required = spec.get("required", True)
+        self._only_if = _compile_selectors(spec["only_if"]) if "only_if" in spec else None
+        if "element" in spec:
+            selectors = _compile_selectors(spec["element"])
+            self._test = lambda s: _matches_element(s, selectors)
+        elif "css" in spec:
+            prop_re = re.compile(rf"(?:{spec['css']})")
+            value_re = re.compile(spec["value"]) if "value" in spec else None
+            self._test = lambda s: any(
+                prop_re.fullmatch(prop) and (value_re is None or value_re.fullmatch(value))
+                for prop, value in s.declarations
+            )
+        elif "selector" in spec:
+            selector_re = re.compile(spec["selector"])
+            self._test = lambda s: any(selector_re.search(rule.selector) for rule in s.rules)
+        elif spec.get("media"):
+            self._test = lambda s: any(rule.media for rule in s.rules)
+        else:
+            raise ValueError(f"Regra de correção '{self.id}' sem tipo conhecido.")
+
+    def applies(self, submission):
+        return self._only_if is None or _matches_element(submission, self._only_if)
+
+    def run(self, submission):
+        return self._test(submission)
+
+
+class Grader:
+    def __init__(self, topic_keys=None, rule_sets=RULE_SETS):
+        self.rule_sets = {}
+        for topic, specs in rule_sets.items():
+            if topic_keys is not None and topic not in topic_keys:
+                print(f"AVISO: regras de correção para tópico desconhecido '{topic}' ignoradas.")
+                continue
+            self.rule_sets[topic] = tuple(CompiledCheck(spec) for spec in specs)
+
+    def can_grade(self, topic):
+        return topic in self.rule_sets
+
+    def grade(self, topic, code, css=""):
+        """Corrige o código para o tópico; retorna None se o tópico não tiver regras (exercício aberto)."""
+        checks = self.rule_sets.get(topic)
+        if checks is None:
+            return None
+        submission = Submission(code, css)
+        results = []
+        for check in checks:
+            if not check.applies(submission):
+                continue
+            results.append({"id": check.id, "passed": check.run(submission), "required": check.required, "hint": check.hint})
+
+        required = [r for r in results if r["required"]]
+        passed = all(r["passed"] for r in required)
+        return {
+            "topic": topic,
+            "passed": passed,
+            "score": round(sum(r["passed"] for r in required) / len(required), 4) if required else 1.0,
+            "checks": results,
+            "hints": [r["hint"] for r in results if not r["passed"]],
+        }
@@ -1,12 +1,30 @@
+import startup # Primeiro import: marca o início da medição de cold start
+import contextvars
 import os
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from dotenv import load_dotenv
-import google.generativeai as genai
-import traceback
+import json
+import threading
 import uuid # Importa a biblioteca uuid para gerar IDs de sessão
-import datetime # Para timestamps no log de feedback
-from google.api_core import exceptions # Importa as exceções da API Core
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+with startup.timed("flask"):
+    from flask import Flask, request, jsonify, Response, stream_with_context, g
+    from flask_cors import CORS
+with startup.timed("dotenv"):
+    from dotenv import load_dotenv
+with startup.timed("local_modules"):
+    from conversation_context import (
+        CONTEXT_SUMMARY_WORKERS, build_context, estimate_tokens, refresh_summary, summary_prompt,
+        summary_refresh_due,
+    )
+    from session_store import create_session_store
+    from response_cache import create_response_cache, make_key
+    from upstream import GeminiClient, UpstreamIncomplete, UpstreamSaturated, UpstreamTimeout
+    from feedback_pipeline import FEEDBACK_TYPES, FeedbackPipeline
+    from topic_graph import load_topic_graph
+    from grader import Grader, MAX_SUBMISSION_CHARS
+    from observability import REGISTRY, LATENCY_BUCKETS, SIZE_BUCKETS, COUNT_BUCKETS, current_request_id, log_event, log_error
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -16,141 +34,130 @@ CORS(app)
 
 # Use uma variável de ambiente para a chave da API
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Inicializa o modelo Gemini
-# Verifica se a chave da API está definida antes de configurar o genai
-if GOOGLE_API_KEY:
-    try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-        # Alterado o modelo para gemini-1.5-flash-latest
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        print("Modelo Gemini-1.5-flash-latest carregado com sucesso.")
-    except Exception as e:
-        print(f"Erro ao configurar a API ou carregar o modelo Gemini: {e}")
-        gemini_model = None
-else:
+GEMINI_MODEL_NAME = "gemini-1.5-flash-latest"
+# Inicializa o Gemini em segundo plano logo no carregamento (útil fora do serverless)
+GEMINI_WARMUP_ON_START = os.getenv("GEMINI_WARMUP_ON_START", "false").lower() in ("1", "true", "yes")
+
+# O SDK do Gemini é pesado para importar; ele só é carregado na primeira rota que
+# precisa do modelo (ou no /api/warmup), para que rotas simples respondam rápido
+# numa instância recém-criada.
+genai = None
+exceptions = None
+gemini_model = None
+_gemini_lock = threading.Lock()
+_gemini_configured = False
+
+if not GOOGLE_API_KEY:
     print("AVISO: A variável de ambiente GOOGLE_API_KEY não está definida.")
     print("Por favor, crie um arquivo .env na mesma pasta de app.py com GOOGLE_API_KEY='SUA_CHAVE_DA_API_AQUI'.")
     print("Você pode obter uma chave em: https://aistudio.google.com/app/apikey")
     print("Sem a chave, a integração com a API do Gemini NÃO FUNCIONARÁ.")
-    gemini_model = None
-
-
-# Dicionários globais para armazenar o estado por sessão
-session_histories = {}
-session_modes = {}
-session_current_topic = {}
-session_exercise_scores = {} # Armazena {session_id: {'correct': 0, 'total': 0}}
-
-# --- NOVOS TÓPICOS DE APRENDIZAGEM PARA HTML E CSS ---
-LEARNING_TOPICS = {
-    "html_intro": {
-        "name": "Introdução ao HTML",
-        "description": "Conceitos básicos de HTML, estrutura de um documento HTML, elementos e tags essenciais (<html>, <head>, <body>, <p>, <h1>-<h6>).",
-        "next": "html_text"
-    },
-    "html_text": {
-        "name": "Estruturação de Texto em HTML",
-        "description": "Como usar tags para formatar texto (<b>, <i>, <u>, <em>, <strong>), criar listas (<ol>, <ul>, <li>) e links (<a>).",
-        "next": "html_media"
-    },
-    "html_media": {
-        "name": "Mídia em HTML",
-        "description": "Incorporar imagens (<img>), áudio (<audio>) e vídeo (<video>) em páginas web.",
-        "next": "html_forms"
-    },
-    "html_forms": {
-        "name": "Formulários HTML",
-        "description": "Criar formulários interativos com diferentes tipos de input (<input>, <textarea>, <button>), labels e atributos.",
-        "next": "css_intro"
-    },
-    "css_intro": {
-        "name": "Introdução ao CSS",
-        "description": "O que é CSS, como incluir CSS em HTML (inline, interno, externo) e seletores básicos (elemento, classe, ID).",
-        "next": "css_colors_fonts"
-    },
-    "css_colors_fonts": {
-        "name": "Cores e Fontes em CSS",
-        "description": "Aplicar cores (color, background-color), escolher fontes (font-family, font-size, font-weight) e ajustar o estilo do texto.",
-        "next": "css_box_model"
-    },
-    "css_box_model": {
-        "name": "Modelo de Caixa do CSS",
-        "description": "Entender margin, padding, border e content para o layout e espaçamento de elementos na página.",
-        "next": "css_flexbox"
-    },
-    "css_flexbox": {
-        "name": "Flexbox para Layouts",
-        "description": "Criar layouts flexíveis e responsivos usando Flexbox (display: flex, justify-content, align-items, flex-direction).",
-        "next": "css_grid"
-    },
-    "css_grid": {
-        "name": "Grid CSS para Layouts Complexos",
-        "description": "Construir layouts baseados em grade com CSS Grid (display: grid, grid-template-columns, grid-template-rows, gap).",
-        "next": "responsive_design"
-    },
-    "responsive_design": {
-        "name": "Design Responsivo",
-        "description": "Tornar páginas web adaptáveis a diferentes tamanhos de tela usando Media Queries e princípios de design responsivo.",
-        "next": "html_css_project"
-    },
-    "html_css_project": {
-        "name": "Projeto Prático HTML & CSS",
-        "description": "Aplicar todos os conhecimentos adquiridos em um projeto prático de construção de uma página web completa.",
-        "next": None # Último tópico
-    }
-}
-
-# --- NOVO: Manipulador de erro genérico para Flask ---
-@app.errorhandler(500)
-def internal_server_error(e):
-    # Imprime o traceback completo no terminal do backend para depuração
-    traceback.print_exc()
-    return jsonify(error="Internal Server Error", message=str(e)), 500
-
-@app.route('/api/start-session', methods=['POST'])
-def start_session():
-    try: # Adicionado try-except para capturar erros específicos da rota
-        data = request.json
-        user_name = data.get('userName')
-        user_email = data.get('userEmail')
-        session_id = str(uuid.uuid4()) # Gera um UUID único para a sessão
-
-        session_histories[session_id] = []
-        session_modes[session_id] = "iniciante" # Modo padrão
-        session_current_topic[session_id] = "html_intro" # Tópico padrão
-        session_exercise_scores[session_id] = {'correct': 0, 'total': 0}
-
-        print(f"Nova sessão iniciada: {session_id} para {user_name} ({user_email})")
-        return jsonify({"sessionId": session_id, "currentTopic": "html_intro", "currentMode": "iniciante"})
-    except Exception as e:
-        print(f"Erro na rota /api/start-session: {e}")
-        traceback.print_exc() # Imprime o traceback completo
-        return jsonify({"error": "Erro interno ao iniciar a sessão."}), 500
-
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    if not GOOGLE_API_KEY or not gemini_model:
-        return jsonify({"error": "Serviço Gemini não configurado ou inicializado. Verifique sua API Key e logs do backend."}), 500
 
-    data = request.json
-    user_message = data.get('message')
-    session_id = data.get('sessionId')
-    current_topic_key = data.get('currentTopic')
-    current_mode = data.get('currentMode')
-
-    if not session_id or session_id not in session_histories:
-        return jsonify({"error": "Sessão inválida ou não iniciada."}), 400
-
-    if not user_message:
-        return jsonify({"error": "Mensagem vazia."}), 400
-
-    # Atualiza o tópico e o modo para a sessão
-    session_current_topic[session_id] = current_topic_key
-    session_modes[session_id] = current_mode
-
-    history = session_histories[session_id]
+def load_gemini_sdk():
+    """Importa o SDK do Gemini e as exceções da API Core na primeira chamada."""
+    global genai, exceptions
+    if genai is not None:
+        return
+    with _gemini_lock:
+        if genai is not None:
+            return
+        with startup.timed("google.api_core"):
+            from google.api_core import exceptions as api_exceptions # Importa as exceções da API Core
+        with startup.timed("google.generativeai"):
+            import google.generativeai as generativeai
+        exceptions = api_exceptions
+        genai = generativeai
+
+
+def get_gemini_model():
+    """Retorna o modelo Gemini, configurando-o na primeira chamada (None se indisponível)."""
+    global gemini_model, _gemini_configured
+    load_gemini_sdk()
+    if _gemini_configured or gemini_model is not None:
+        return gemini_model
+    with _gemini_lock:
+        if not _gemini_configured and gemini_model is None and GOOGLE_API_KEY:
+            try:
+                with startup.timed("gemini_configure"):
+                    genai.configure(api_key=GOOGLE_API_KEY)
+                    # Alterado o modelo para gemini-1.5-flash-latest
+                    gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                log_event("gemini_ready", model=GEMINI_MODEL_NAME)
+            except Exception as e:
+                log_error("gemini_configure_failed", e, with_traceback=True)
+                gemini_model = None
+        _gemini_configured = True
+    startup.mark("geminiReady")
+    return gemini_model
+
+
+# Armazenamento do estado por sessão (histórico, modo, tópico, placar e resumo do contexto).
+# Backend configurável via SESSION_STORE=memory|sqlite; veja session_store.py.
+session_store = create_session_store()
+
+# --- MÉTRICAS (expostas em /api/metrics no formato do Prometheus) ---
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "tutor_http_request_duration_seconds",
+    "Latência das rotas até o envio dos cabeçalhos (em streaming, o tempo até o início do stream).",
+    LATENCY_BUCKETS, ("route", "method", "status"))
+UPSTREAM_CALL_DURATION = REGISTRY.histogram(
+    "tutor_upstream_call_duration_seconds", "Duração de cada tentativa de chamada ao Gemini.",
+    LATENCY_BUCKETS, ("operation", "outcome"))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "tutor_upstream_errors_total", "Erros nas chamadas ao Gemini por tipo de exceção.", ("operation", "exception"))
+PROMPT_CHARS = REGISTRY.histogram(
+    "tutor_prompt_chars", "Tamanho em caracteres da prompt enviada ao Gemini.", SIZE_BUCKETS)
+CONTEXT_TOKENS = REGISTRY.histogram(
+    "tutor_context_estimated_tokens", "Tokens estimados do histórico enviado ao Gemini.", SIZE_BUCKETS)
+RESPONSE_CHARS = REGISTRY.histogram(
+    "tutor_response_chars", "Tamanho em caracteres da resposta do tutor.", SIZE_BUCKETS, ("cached",))
+GRADER_RESULTS = REGISTRY.counter(
+    "tutor_grader_results_total", "Exercícios corrigidos localmente por tópico e resultado.", ("topic", "outcome"))
+HISTORY_TURNS = REGISTRY.histogram(
+    "tutor_session_history_turns", "Número de trocas no histórico da sessão a cada mensagem.", COUNT_BUCKETS)
+
+
+def observe_upstream_call(operation, seconds, error):
+    """Observador do GeminiClient: registra duração e erros de cada tentativa."""
+    outcome = "error" if error is not None else "ok"
+    UPSTREAM_CALL_DURATION.observe(seconds, operation=operation, outcome=outcome)
+    fields = {"operation": operation, "durationMs": round(seconds * 1000, 2), "outcome": outcome}
+    if error is not None:
+        UPSTREAM_ERRORS.inc(operation=operation, exception=type(error).__name__)
+        fields["exception"] = type(error).__name__
+    log_event("upstream_call", level="error" if error is not None else "info", **fields)
+
+
+# Todas as chamadas ao Gemini passam por este cliente (concorrência limitada, retries e coalescência)
+upstream_client = GeminiClient(get_gemini_model, on_call=observe_upstream_call)
+
+# Feedback de like/dislike gravado em lote por uma thread em segundo plano
+feedback_pipeline = FeedbackPipeline()
+
+# Cache de respostas para perguntas sem contexto (None se RESPONSE_CACHE_ENABLED=false)
+response_cache = create_response_cache()
+
+REGISTRY.gauge("tutor_active_sessions", "Sessões ativas no armazenamento.", session_store.count)
+REGISTRY.gauge("tutor_upstream_pending_calls", "Chamadas ao Gemini em execução ou na fila.",
+               lambda: upstream_client.stats()["pending"])
+
+if GEMINI_WARMUP_ON_START:
+    threading.Thread(target=get_gemini_model, name="gemini-warmup", daemon=True).start()
+
+# --- TÓPICOS DE APRENDIZAGEM PARA HTML E CSS ---
+# A trilha é definida em learning_topics.json e carregada uma vez, já validada e
+# com ordem, pré-requisitos, recomendações e JSON serializado pré-calculados.
+with startup.timed("topic_graph"):
+    topic_graph = load_topic_graph()
+LEARNING_TOPICS = topic_graph.topics
+
+# Regras de correção local por tópico, compiladas uma única vez
+with startup.timed("grader"):
+    grader = Grader(topic_keys=LEARNING_TOPICS)
+
+def build_prompt_prefix(current_topic_key, current_mode):
+    """Instruções do tutor para o modo e o tópico atuais (a prompt sem a mensagem do aluno)."""
     topic_name = LEARNING_TOPICS.get(current_topic_key, {}).get("name", "tópico desconhecido")
 
     # Construção da prompt com base no modo e tópico
@@ -180,56 +187,385 @@ def chat():
             f"Apresente problemas complexos para o utilizador resolver e discuta arquiteturas. "
             f"Seja desafiador e proporcione insights aprofundados."
         )
+    return prompt_prefix
+
+
+def build_prompt(current_topic_key, current_mode, user_message):
+    """Monta a prompt enviada ao Gemini com base no modo e no tópico atuais."""
+    return f"{build_prompt_prefix(current_topic_key, current_mode)}\n\nUtilizador: {user_message}"
+
+
+def detect_exercise(ai_response_text):
+    """Determina se a resposta do tutor contém um exercício ou desafio."""
+    text = ai_response_text.lower()
+    return "exercício" in text or "desafio" in text
+
+
+def summarize_history(previous_summary, messages):
+    """Incorpora novas trocas ao resumo acumulado da sessão usando o Gemini."""
+    return upstream_client.generate(summary_prompt(previous_summary, messages)).strip()
+
+
+# Os resumos são atualizados fora do caminho da requisição, no máximo um por sessão por vez
+summary_executor = ThreadPoolExecutor(max_workers=CONTEXT_SUMMARY_WORKERS, thread_name_prefix="summary")
+_summaries_lock = threading.Lock()
+_summaries_running = set()
 
-    full_prompt = f"{prompt_prefix}\n\nUtilizador: {user_message}"
 
+def refresh_session_summary(session_id):
+    """Atualiza o resumo da sessão (roda no summary_executor)."""
     try:
-        chat_session = gemini_model.start_chat(history=history)
-        response = chat_session.send_message(full_prompt)
-        ai_response_text = response.text
+        session = session_store.get(session_id)
+        if session is None:
+            return
+        end = summary_refresh_due(session["history"], session["summary"])
+        if end is None:
+            return
+        summary_state = refresh_summary(session["history"], session["summary"], summarize_history, end)
+        session_store.update(session_id, summary=summary_state)
+        log_event("summary_refresh", sessionId=session_id, summarizedTurns=summary_state["covered"] // 2,
+                  failures=summary_state["failures"])
+    except Exception as e:
+        log_error("summary_refresh_failed", e, with_traceback=True, sessionId=session_id)
+    finally:
+        with _summaries_lock:
+            _summaries_running.discard(session_id)
+
+
+def schedule_summary_refresh(session_id, session, new_messages):
+    """Agenda a atualização do resumo se a troca recém-gravada a tornou necessária.
+
+    Chamado depois que a resposta já foi gerada, para que o resumo nunca atrase
+    o chat nem o primeiro trecho do stream.
+    """
+    if summary_refresh_due(session["history"] + new_messages, session["summary"]) is None:
+        return
+    with _summaries_lock:
+        if session_id in _summaries_running:
+            return
+        _summaries_running.add(session_id)
+    summary_executor.submit(contextvars.copy_context().run, refresh_session_summary, session_id)
+
+
+def prepare_context(session_id, session, full_prompt):
+    """Monta o histórico limitado da sessão a partir do resumo já disponível."""
+    context, context_stats = build_context(session["history"], session["summary"])
+    context_stats["promptTokens"] = estimate_tokens(full_prompt)
+    PROMPT_CHARS.observe(len(full_prompt))
+    CONTEXT_TOKENS.observe(context_stats["estimatedTokens"])
+    HISTORY_TURNS.observe(context_stats["turnsTotal"])
+    log_event("chat_context", sessionId=session_id, **context_stats)
+    return context, context_stats
+
+
+def response_cache_key(session, current_topic_key, current_mode, user_message):
+    """Só a primeira troca da sessão (sem histórico) depende apenas de tópico, modo e pergunta."""
+    if response_cache is None or session["history"]:
+        return None
+    # Trocar o modelo ou editar as instruções invalida as respostas já guardadas
+    version = f"{GEMINI_MODEL_NAME}|{build_prompt_prefix(current_topic_key, current_mode)}"
+    return make_key(current_topic_key, current_mode, user_message, version=version)
+
+
+def sse_event(event, payload):
+    """Formata um evento Server-Sent Events com payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+# IDs recebidos de fora vão para os logs e para o cabeçalho da resposta; só os bem-comportados são aceitos
+REQUEST_ID_RE = re.compile(r"[A-Za-z0-9-]{1,64}")
+
+
+@app.before_request
+def start_request_tracing():
+    startup.mark("firstRequest")
+    # Reaproveita o X-Request-ID de um proxy, se houver e for válido, para correlacionar os logs
+    incoming_id = request.headers.get("X-Request-ID", "")
+    g.request_id = incoming_id if REQUEST_ID_RE.fullmatch(incoming_id) else uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    current_request_id.set(g.request_id)
+
+
+@app.after_request
+def finish_request_tracing(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    duration = time.perf_counter() - started
+    # Usa o padrão da rota (e não o caminho) para manter a cardinalidade baixa
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUEST_DURATION.observe(duration, route=route, method=request.method, status=response.status_code)
+    response.headers["X-Request-ID"] = g.request_id
+    log_event("http_request", method=request.method, route=route, status=response.status_code,
+              durationMs=round(duration * 1000, 2))
+    return response
+
+
+# --- NOVO: Manipulador de erro genérico para Flask ---
+@app.errorhandler(500)
+def internal_server_error(e):
+    # Registra o erro original (com traceback) para depuração
+    log_error("unhandled_error", getattr(e, "original_exception", None) or e, with_traceback=True)
+    return jsonify(error="Internal Server Error", message=str(e)), 500
+
+@app.route('/api/start-session', methods=['POST'])
+def start_session():
+    try: # Adicionado try-except para capturar erros específicos da rota
+        data = request.json
+        user_name = data.get('userName')
+        user_email = data.get('userEmail')
+        session_id = str(uuid.uuid4()) # Gera um UUID único para a sessão
 
-        # Atualiza o histórico da sessão
-        history.append({"role": "user", "parts": [{"text": user_message}]})
-        history.append({"role": "model", "parts": [{"text": ai_response_text}]})
-        session_histories[session_id] = history
+        session_store.create(session_id, mode="iniciante", topic="html_intro") # Modo e tópico padrão
 
+        log_event("session_started", sessionId=session_id, userName=user_name, userEmail=user_email)
+        return jsonify({"sessionId": session_id, "currentTopic": "html_intro", "currentMode": "iniciante"})
+    except Exception as e:
+        log_error("route_error", e, with_traceback=True, route="/api/start-session")
+        return jsonify({"error": "Erro interno ao iniciar a sessão."}), 500
+
+
+def finish_chat(session_id, session, user_message, ai_response_text, cached, context_stats):
+    """Grava a troca no histórico e monta a resposta de /api/chat."""
+    new_messages = [
+        {"role": "user", "parts": [{"text": user_message}]},
+        {"role": "model", "parts": [{"text": ai_response_text}]}
+    ]
+    session_store.append_history(session_id, new_messages)
+    schedule_summary_refresh(session_id, session, new_messages)
+    RESPONSE_CHARS.observe(len(ai_response_text), cached="true" if cached else "false")
+    return {
+        "response": ai_response_text,
+        "sessionId": session_id,
         # Determinar se a última mensagem do tutor é um exercício
-        is_exercise = "exercício" in ai_response_text.lower() or "desafio" in ai_response_text.lower()
+        "isExercise": detect_exercise(ai_response_text),
+        "cached": cached,
+        "contextStats": context_stats
+    }
+
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    if not GOOGLE_API_KEY:
+        return jsonify({"error": "Serviço Gemini não configurado ou inicializado. Verifique sua API Key e logs do backend."}), 500
 
-        return jsonify({
-            "response": ai_response_text,
-            "sessionId": session_id,
-            "isExercise": is_exercise
-        })
+    data = request.json
+    user_message = data.get('message')
+    session_id = data.get('sessionId')
+    current_topic_key = data.get('currentTopic')
+    current_mode = data.get('currentMode')
+
+    session = session_store.get(session_id) if session_id else None
+    if session is None:
+        return jsonify({"error": "Sessão inválida ou não iniciada."}), 400
+
+    if not user_message:
+        return jsonify({"error": "Mensagem vazia."}), 400
+
+    # Atualiza o tópico e o modo para a sessão
+    session_store.update(session_id, mode=current_mode, topic=current_topic_key)
+
+    full_prompt = build_prompt(current_topic_key, current_mode, user_message)
+    context, context_stats = prepare_context(session_id, session, full_prompt)
+    cache_key = response_cache_key(session, current_topic_key, current_mode, user_message)
+    cached_text = response_cache.get(cache_key) if cache_key else None
+    # Respostas do cache não precisam do SDK: o modelo só é carregado num miss
+    if cached_text is not None:
+        return jsonify(finish_chat(session_id, session, user_message, cached_text, True, context_stats))
+    if not get_gemini_model():
+        return jsonify({"error": "Serviço Gemini não configurado ou inicializado. Verifique sua API Key e logs do backend."}), 500
+
+    try:
+        ai_response_text = upstream_client.send_message(context, full_prompt)
+        if cache_key:
+            response_cache.put(cache_key, ai_response_text)
+        return jsonify(finish_chat(session_id, session, user_message, ai_response_text, False, context_stats))
     except genai.types.BlockedPromptException as e:
         block_reason = e.response.prompt_feedback.block_reason.name if e.response.prompt_feedback.block_reason else "Desconhecido"
-        print(f"Sua pergunta foi bloqueada pela API do Gemini. Razão: {block_reason}")
+        log_event("gemini_blocked", level="warning", route="/api/chat", reason=block_reason, sessionId=session_id)
         tutor_reply = f"Sua pergunta foi bloqueada por razões de segurança: {block_reason}. Por favor, tente reformular."
         return jsonify({"reply": tutor_reply, "sessionId": session_id}), 400
+    except UpstreamSaturated as e:
+        log_error("gemini_rejected", e, level="warning", route="/api/chat", sessionId=session_id)
+        return jsonify({"error": "O tutor está recebendo muitas perguntas agora. Tente novamente em instantes.", "sessionId": session_id}), 503
+    except UpstreamTimeout as e:
+        log_error("gemini_timeout", e, route="/api/chat", sessionId=session_id)
+        return jsonify({"error": "O tutor demorou demais para responder. Tente novamente.", "sessionId": session_id}), 504
     # Captura exceções mais genéricas ou específicas da API Core
     except exceptions.NotFound as e:
-        print(f"Erro da API do Gemini (NotFound): {e}")
-        traceback.print_exc()
+        log_error("gemini_error", e, with_traceback=True, route="/api/chat", sessionId=session_id)
         return jsonify({"error": f"Erro da API do Gemini: Modelo não encontrado ou não suportado. Detalhes: {str(e)}", "sessionId": session_id}), 500
     except exceptions.GoogleAPICallError as e:
-        print(f"Erro da API do Gemini (GoogleAPICallError): {e}")
-        traceback.print_exc()
+        log_error("gemini_error", e, with_traceback=True, route="/api/chat", sessionId=session_id)
         return jsonify({"error": f"Erro da API do Gemini: {str(e)}", "sessionId": session_id}), 500
     except Exception as e:
-        print(f"Erro inesperado no backend: {e}")
-        traceback.print_exc()
+        log_error("route_error", e, with_traceback=True, route="/api/chat", sessionId=session_id)
         return jsonify({"error": f"Erro interno do servidor: {str(e)}", "sessionId": session_id}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Variante em streaming (SSE) de /api/chat: envia os trechos da resposta à medida que chegam."""
+    if not GOOGLE_API_KEY or not get_gemini_model():
+        return jsonify({"error": "Serviço Gemini não configurado ou inicializado. Verifique sua API Key e logs do backend."}), 500
+
+    data = request.json
+    user_message = data.get('message')
+    session_id = data.get('sessionId')
+    current_topic_key = data.get('currentTopic')
+    current_mode = data.get('currentMode')
+
+    session = session_store.get(session_id) if session_id else None
+    if session is None:
+        return jsonify({"error": "Sessão inválida ou não iniciada."}), 400
+
+    if not user_message:
+        return jsonify({"error": "Mensagem vazia."}), 400
+
+    session_store.update(session_id, mode=current_mode, topic=current_topic_key)
+
+    full_prompt = build_prompt(current_topic_key, current_mode, user_message)
+    context, context_stats = prepare_context(session_id, session, full_prompt)
+    cache_key = response_cache_key(session, current_topic_key, current_mode, user_message)
+    cached_text = response_cache.get(cache_key) if cache_key else None
+
+    # A chamada é admitida antes de responder: com todas as vagas ocupadas, o cliente recebe 503
+    upstream_stream = None
+    if cached_text is None:
+        try:
+            upstream_stream = upstream_client.stream_message(context, full_prompt)
+        except UpstreamSaturated as e:
+            log_error("gemini_rejected", e, level="warning", route="/api/chat/stream", sessionId=session_id)
+            return jsonify({"error": "O tutor está recebendo muitas perguntas agora. Tente novamente em instantes.", "sessionId": session_id}), 503
+
+    def generate():
+        parts = []
+        try:
+            if cached_text is not None:
+                parts.append(cached_text)
+                yield sse_event("chunk", {"text": cached_text})
+            else:
+                for chunk_text in upstream_stream:
+                    parts.append(chunk_text)
+                    yield sse_event("chunk", {"text": chunk_text})
+
+            ai_response_text = "".join(parts)
+            if cache_key and cached_text is None:
+                response_cache.put(cache_key, ai_response_text)
+            RESPONSE_CHARS.observe(len(ai_response_text), cached="true" if cached_text is not None else "false")
+
+            # Só grava no histórico quando a resposta foi gerada por completo
+            new_messages = [
+                {"role": "user", "parts": [{"text": user_message}]},
+                {"role": "model", "parts": [{"text": ai_response_text}]}
+            ]
+            session_store.append_history(session_id, new_messages)
+            schedule_summary_refresh(session_id, session, new_messages)
+
+            yield sse_event("done", {
+                "response": ai_response_text,
+                "sessionId": session_id,
+                "isExercise": detect_exercise(ai_response_text),
+                "cached": cached_text is not None,
+                "contextStats": context_stats
+            })
+        except genai.types.BlockedPromptException as e:
+            block_reason = e.response.prompt_feedback.block_reason.name if e.response.prompt_feedback.block_reason else "Desconhecido"
+            log_event("gemini_blocked", level="warning", route="/api/chat/stream", reason=block_reason, sessionId=session_id)
+            tutor_reply = f"Sua pergunta foi bloqueada por razões de segurança: {block_reason}. Por favor, tente reformular."
+            yield sse_event("error", {"reply": tutor_reply, "sessionId": session_id, "partial": "".join(parts)})
+        except UpstreamTimeout as e:
+            log_error("gemini_timeout", e, route="/api/chat/stream", sessionId=session_id)
+            yield sse_event("error", {"error": "O tutor demorou demais para responder. Tente novamente.", "sessionId": session_id, "partial": "".join(parts)})
+        except UpstreamIncomplete as e:
+            # A resposta parcial não vai para o histórico nem para o cache
+            log_error("gemini_incomplete", e, level="warning", route="/api/chat/stream", reason=e.reason,
+                      sessionId=session_id, partialChars=sum(len(part) for part in parts))
+            tutor_reply = f"A resposta foi interrompida por razões de segurança: {e.reason}. Por favor, tente reformular."
+            yield sse_event("error", {"reply": tutor_reply, "sessionId": session_id, "reason": e.reason, "partial": "".join(parts)})
+        except exceptions.NotFound as e:
+            log_error("gemini_error", e, with_traceback=True, route="/api/chat/stream", sessionId=session_id)
+            yield sse_event("error", {"error": f"Erro da API do Gemini: Modelo não encontrado ou não suportado. Detalhes: {str(e)}", "sessionId": session_id})
+        except exceptions.GoogleAPICallError as e:
+            log_error("gemini_error", e, with_traceback=True, route="/api/chat/stream", sessionId=session_id)
+            yield sse_event("error", {"error": f"Erro da API do Gemini: {str(e)}", "sessionId": session_id, "partial": "".join(parts)})
+        except Exception as e:
+            log_error("route_error", e, with_traceback=True, route="/api/chat/stream", sessionId=session_id)
+            yield sse_event("error", {"error": f"Erro interno do servidor: {str(e)}", "sessionId": session_id, "partial": "".join(parts)})
+        finally:
+            if upstream_stream is not None:
+                upstream_stream.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Evita que proxies acumulem a resposta antes de enviar
+        }
+    )
+    # Libera a admissão mesmo se o cliente desconectar antes de o gerador começar
+    if upstream_stream is not None:
+        response.call_on_close(upstream_stream.close)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/warmup', methods=['GET', 'POST'])
+def warmup():
+    """Carrega o SDK e configura o Gemini antecipadamente (ex.: chamado por um cron após o deploy)."""
+    model_ready = get_gemini_model() is not None
+    return jsonify({"geminiReady": model_ready, "startup": startup.report()})
+
+@app.route('/api/startup-report', methods=['GET'])
+def get_startup_report():
+    return jsonify(startup.report())
+
+@app.route('/api/upstream/stats', methods=['GET'])
+def get_upstream_stats():
+    return jsonify(upstream_client.stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    if response_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(response_cache.stats())
+
 @app.route('/api/get-learning-topics', methods=['GET'])
 def get_learning_topics():
     try: # Adicionado try-except para capturar erros específicos da rota
-        # Retorna a lista de tópicos e suas descrições
-        return jsonify(LEARNING_TOPICS)
+        # Retorna a lista de tópicos já serializada; o cliente revalida com If-None-Match
+        if request.if_none_match.contains_weak(topic_graph.etag):
+            response = Response(status=304)
+        else:
+            response = Response(topic_graph.payload, mimetype="application/json")
+        response.set_etag(topic_graph.etag)
+        response.headers["Cache-Control"] = "public, max-age=0, must-revalidate"
+        return response
     except Exception as e:
-        print(f"Erro na rota /api/get-learning-topics: {e}")
-        traceback.print_exc() # Imprime o traceback completo
+        log_error("route_error", e, with_traceback=True, route="/api/get-learning-topics")
         return jsonify({"error": "Erro interno ao buscar tópicos de aprendizado."}), 500
 
+@app.route('/api/next-topics', methods=['GET'])
+def get_next_topics():
+    try:
+        session_id = request.args.get('sessionId')
+        current_topic = request.args.get('currentTopic')
+        state = session_store.get_state(session_id) if session_id else None
+        if session_id and state is None:
+            return jsonify({"error": "Sessão inválida ou não iniciada."}), 400
+        if current_topic and current_topic not in topic_graph:
+            return jsonify({"error": f"Tópico desconhecido: {current_topic}"}), 400
+
+        current_topic = current_topic or (state["topic"] if state else None)
+        # Só o placar do tópico atual decide se é hora de revisar
+        scores = state["topicScores"].get(current_topic) if state else None
+        return jsonify(topic_graph.recommend(current_topic, scores))
+    except Exception as e:
+        log_error("route_error", e, with_traceback=True, route="/api/next-topics")
+        return jsonify({"error": "Erro interno ao recomendar próximos tópicos."}), 500
+
 @app.route('/api/feedback', methods=['POST'])
 def receive_feedback():
     data = request.json
@@ -237,59 +573,122 @@ def receive_feedback():
     feedback_type = data.get('feedbackType') # 'like' ou 'dislike'
     message_text = data.get('messageText') # Texto da mensagem avaliada
     session_id = data.get('sessionId') # Pega o ID da sessão para o log
+    topic = data.get('currentTopic')
+    mode = data.get('currentMode')
 
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    feedback_entry = (
-        f"[{timestamp}] Session ID: {session_id}, "
-        f"Message ID: {message_id}, "
-        f"Feedback: {feedback_type}, "
-        "Message: \"" + message_text.replace("\n", " ").strip() + "\"\n" # LINHA CORRIGIDA
-    )
+    if feedback_type not in FEEDBACK_TYPES:
+        return jsonify({"status": "error", "message": "Tipo de feedback inválido."}), 400
+
+    # Clientes antigos não enviam tópico/modo: usa o estado atual da sessão
+    if (not topic or not mode) and session_id:
+        state = session_store.get_state(session_id)
+        if state is not None:
+            topic = topic or state["topic"]
+            mode = mode or state["mode"]
 
-    # --- SALVA O FEEDBACK EM UM ARQUIVO DE LOG ---
+    # --- ENFILEIRA O FEEDBACK; A GRAVAÇÃO EM DISCO É FEITA EM LOTE ---
     try:
-        with open("feedback.log", "a", encoding="utf-8") as f:
-            f.write(feedback_entry)
-        print(f"Feedback registrado no arquivo: {feedback_entry.strip()}")
+        feedback_pipeline.submit(session_id, message_id, feedback_type, message_text, topic=topic, mode=mode)
         return jsonify({"status": "success", "message": "Feedback recebido."})
+    except queue.Full:
+        log_event("feedback_dropped", level="warning", reason="queue_full", sessionId=session_id)
+        return jsonify({"status": "error", "message": "Erro ao registrar feedback.", "error": "Fila de feedback cheia."}), 503
     except Exception as e:
-        print(f"Erro ao escrever feedback no arquivo: {e}")
+        log_error("route_error", e, with_traceback=True, route="/api/feedback", sessionId=session_id)
         return jsonify({"status": "error", "message": "Erro ao registrar feedback.", "error": str(e)}), 500
 
+@app.route('/api/feedback/stats', methods=['GET'])
+def get_feedback_stats():
+    try:
+        granularity = request.args.get('bucket', 'hour')
+        if granularity not in ('hour', 'day'):
+            return jsonify({"error": "Parâmetro bucket deve ser 'hour' ou 'day'."}), 400
+        return jsonify(feedback_pipeline.stats(granularity))
+    except Exception as e:
+        log_error("route_error", e, with_traceback=True, route="/api/feedback/stats")
+        return jsonify({"error": "Erro interno ao buscar estatísticas de feedback."}), 500
+
 @app.route('/api/exercise-evaluation', methods=['POST'])
 def exercise_evaluation():
     try: # Adicionado try-except para capturar erros específicos da rota
         data = request.json
         session_id = data.get('sessionId')
         is_correct = data.get('isCorrect')
-
-        if not session_id or session_id not in session_exercise_scores:
+        topic = data.get('currentTopic')
+        if not topic and session_id:
+            state = session_store.get_state(session_id)
+            topic = state["topic"] if state else None
+        # Tópicos fora do grafo contam só no placar geral
+        if topic not in topic_graph:
+            topic = None
+
+        # Incremento atômico no placar (seguro entre threads e entre processos no SQLite)
+        scores = session_store.increment_score(session_id, bool(is_correct), topic) if session_id else None
+        if scores is None:
             return jsonify({"error": "Sessão inválida ou não iniciada."}), 400
 
-        scores = session_exercise_scores[session_id]
-        scores['total'] += 1
-        if is_correct:
-            scores['correct'] += 1
-
-        session_exercise_scores[session_id] = scores
-        print(f"Avaliação de exercício para sessão {session_id}: Correctos={scores['correct']}, Total={scores['total']}")
+        log_event("exercise_evaluated", sessionId=session_id, topic=topic, correct=scores["correct"], total=scores["total"])
         return jsonify({"status": "success", "scores": scores})
     except Exception as e:
-        print(f"Erro na rota /api/exercise-evaluation: {e}")
-        traceback.print_exc()
+        log_error("route_error", e, with_traceback=True, route="/api/exercise-evaluation")
         return jsonify({"error": "Erro interno ao avaliar exercício."}), 500
 
+@app.route('/api/grade', methods=['POST'])
+def grade_exercise():
+    """Corrige exercícios de HTML/CSS localmente e atualiza o placar, sem chamar o Gemini."""
+    try:
+        data = request.json
+        session_id = data.get('sessionId')
+        code = data.get('code') or ""
+        css = data.get('css') or ""
+
+        state = session_store.get_state(session_id) if session_id else None
+        if state is None:
+            return jsonify({"error": "Sessão inválida ou não iniciada."}), 400
+        if not isinstance(code, str) or not isinstance(css, str):
+            return jsonify({"error": "Os campos 'code' e 'css' devem ser texto."}), 400
+        if not code.strip() and not css.strip():
+            return jsonify({"error": "Código vazio."}), 400
+        if len(code) + len(css) > MAX_SUBMISSION_CHARS:
+            return jsonify({"error": f"Código muito grande (máximo de {MAX_SUBMISSION_CHARS} caracteres)."}), 413
+
+        topic = data.get('currentTopic') or state["topic"]
+        if topic not in topic_graph:
+            return jsonify({"error": f"Tópico desconhecido: {topic}"}), 400
+        result = grader.grade(topic, code, css)
+        if result is None:
+            # Exercício aberto: sem regras locais, a avaliação continua sendo feita pelo tutor
+            GRADER_RESULTS.inc(topic=topic, outcome="open_ended")
+            return jsonify({
+                "graded": False,
+                "openEnded": True,
+                "topic": topic,
+                "message": "Este tópico não tem correção automática. Envie seu código no chat para o tutor avaliar.",
+                "scores": state["scores"]
+            })
+
+        scores = session_store.increment_score(session_id, result["passed"], topic)
+        GRADER_RESULTS.inc(topic=topic, outcome="passed" if result["passed"] else "failed")
+        log_event("exercise_graded", sessionId=session_id, topic=topic, passed=result["passed"], score=result["score"])
+        return jsonify({"graded": True, "openEnded": False, **result, "scores": scores})
+    except Exception as e:
+        log_error("route_error", e, with_traceback=True, route="/api/grade")
+        return jsonify({"error": "Erro interno ao corrigir exercício."}), 500
+
 @app.route('/api/get-scores', methods=['GET'])
 def get_scores():
     try: # Adicionado try-except para capturar erros específicos da rota
         session_id = request.args.get('sessionId')
-        if not session_id or session_id not in session_exercise_scores:
+        scores = session_store.get_scores(session_id) if session_id else None
+        if scores is None:
             return jsonify({"correct": 0, "total": 0})
-        return jsonify(session_exercise_scores[session_id])
+        return jsonify(scores)
     except Exception as e:
-        print(f"Erro na rota /api/get-scores: {e}")
-        traceback.print_exc()
+        log_error("route_error", e, with_traceback=True, route="/api/get-scores")
         return jsonify({"error": "Erro interno ao buscar pontuações."}), 500
 
+startup.mark("moduleReady")
+print(f"Módulo carregado em {startup.events['moduleReady']:.1f} ms; imports: {startup.import_timings}")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000) # Adicione debug=True e a porta 5000
\ No newline at end of file
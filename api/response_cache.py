@@ -0,0 +1,181 @@
+# Cache de respostas do tutor para perguntas repetidas.
+#
+# Alunos no mesmo tópico fazem perguntas quase idênticas ("o que é flexbox?",
+# "O que é Flexbox"). Para perguntas sem contexto (primeira mensagem da sessão)
+# a resposta depende apenas do tópico, do modo e do texto da pergunta, então
+# pode ser reaproveitada. O cache tem duas camadas:
+#   - memória: LRU limitado por número de entradas, com TTL;
+#   - disco: SQLite, para sobreviver a reinícios do processo.
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from observability import log_error
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+RESPONSE_CACHE_DISK_PATH = os.getenv(
+    "RESPONSE_CACHE_DISK_PATH", os.path.join(tempfile.gettempdir(), "tutor_response_cache.db")
+)
+RESPONSE_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(message):
+    """Normaliza a pergunta: minúsculas, sem acentos, sem pontuação e com espaços simples."""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_key(topic, mode, message, version=""):
+    """Chave do cache. `version` descreve o que mais muda a resposta (modelo e instruções
+    da prompt): quando muda, as entradas antigas deixam de ser encontradas e expiram."""
+    raw = f"{version}|{topic}|{mode}|{normalize_message(message)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # A cada quantas gravações o cache em disco é podado
+    DISK_PRUNE_EVERY = 100
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 disk_path=RESPONSE_CACHE_DISK_PATH, disk_max_entries=RESPONSE_CACHE_DISK_MAX_ENTRIES,
+                 clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (resposta, instante em que foi gerada)
+        self._entries = OrderedDict()
+        self._local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk_writes = 0
+        if self.disk_path:
+            try:
+                conn = self._conn()
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    " key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache(created)")
+            except sqlite3.Error as e:
+                log_error("response_cache_disk_unavailable", e, level="warning", path=self.disk_path)
+                self.disk_path = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created):
+        return self.ttl_seconds > 0 and self._clock() - created > self.ttl_seconds
+
+    def _remember(self, key, response, created):
+        # Chamado com o lock adquirido
+        self._entries[key] = (response, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT response, created FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log_error("response_cache_disk_read_failed", e)
+            return None
+        if row is None or self._expired(row[1]):
+            return None
+        return row
+
+    def _disk_put(self, key, response, created, prune):
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, created) VALUES (?, ?, ?)",
+                (key, response, created),
+            )
+            # Limpeza ocasional: remove entradas expiradas e as mais antigas acima do limite
+            if prune:
+                if self.ttl_seconds > 0:
+                    conn.execute("DELETE FROM response_cache WHERE created < ?", (self._clock() - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    " SELECT key FROM response_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+        except sqlite3.Error as e:
+            log_error("response_cache_disk_write_failed", e)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        row = self._disk_get(key) if self.disk_path else None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key, response):
+        created = self._clock()
+        with self._lock:
+            self._remember(key, response, created)
+            self._disk_writes += 1
+            prune = self._disk_writes % self.DISK_PRUNE_EVERY == 0
+        if self.disk_path:
+            self._disk_put(key, response, created, prune)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "diskPath": self.disk_path,
+            }
+
+
+def create_response_cache():
+    """Cria o cache de respostas, ou None se RESPONSE_CACHE_ENABLED estiver desligado."""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    return ResponseCache()
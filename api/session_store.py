@@ -0,0 +1,503 @@
+# Armazenamento do estado das sessões de tutoria.
+#
+# Cada sessão guarda o histórico da conversa, o modo, o tópico atual, o placar
+# de exercícios (geral e por tópico) e o resumo acumulado do contexto. Há dois backends:
+#   - MemorySessionStore: dicionário em memória com despejo LRU, expiração por
+#     inatividade (TTL) e limite aproximado de memória (a sessão em uso nunca é
+#     despejada; se sozinha passar do limite, perde as trocas mais antigas);
+#   - SQLiteSessionStore: arquivo SQLite em modo WAL, para que vários processos
+#     (workers do gunicorn, por exemplo) na mesma máquina compartilhem sessões.
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from observability import log_event
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(tempfile.gettempdir(), "tutor_sessions.db"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(6 * 60 * 60)))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Custo fixo aproximado de uma sessão (dicionários, chaves, placar) em bytes
+_SESSION_OVERHEAD_BYTES = 512
+
+
+def _empty_scores():
+    return {"correct": 0, "total": 0}
+
+
+def _empty_summary():
+    return {"text": "", "covered": 0}
+
+
+def _estimate_message_bytes(message):
+    return sum(len(part.get("text", "")) + 64 for part in message.get("parts", []))
+
+
+def _estimate_session_bytes(session):
+    size = _SESSION_OVERHEAD_BYTES + len(session["summary"].get("text", ""))
+    for message in session["history"]:
+        size += _estimate_message_bytes(message)
+    return size
+
+
+class SessionStore(ABC):
+    """Interface comum dos backends de sessão.
+
+    `get` devolve uma cópia com as chaves history, mode, topic, scores e summary,
+    ou None se a sessão não existir (ou tiver expirado).
+    """
+
+    @abstractmethod
+    def create(self, session_id, mode, topic):
+        pass
+
+    @abstractmethod
+    def get(self, session_id):
+        pass
+
+    @abstractmethod
+    def get_state(self, session_id):
+        """Modo, tópico, placar e placar por tópico (topicScores), sem carregar o histórico (ou None)."""
+
+    def exists(self, session_id):
+        return self.get_scores(session_id) is not None
+
+    @abstractmethod
+    def update(self, session_id, mode=None, topic=None, summary=None):
+        """Atualiza os campos informados. Retorna False se a sessão não existir."""
+
+    @abstractmethod
+    def append_history(self, session_id, messages):
+        """Acrescenta mensagens ao histórico de forma atômica."""
+
+    @abstractmethod
+    def increment_score(self, session_id, is_correct, topic=None):
+        """Incrementa o placar (e o do tópico, se informado) de forma atômica.
+
+        Retorna o placar geral atualizado, ou None se a sessão não existir.
+        """
+
+    @abstractmethod
+    def get_scores(self, session_id):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id):
+        pass
+
+    @abstractmethod
+    def count(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl_seconds=SESSION_TTL_SECONDS,
+                 max_bytes=SESSION_MAX_BYTES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.RLock()
+        # Ordenado do menos para o mais recentemente usado
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._last_access = {}
+        self._total_bytes = 0
+
+    def _touch(self, session_id):
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = self._clock()
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._total_bytes -= self._sizes.pop(session_id, 0)
+
+    def _resize(self, session_id):
+        new_size = _estimate_session_bytes(self._sessions[session_id])
+        self._total_bytes += new_size - self._sizes.get(session_id, 0)
+        self._sizes[session_id] = new_size
+
+    def _evict(self, keep=None):
+        """Remove sessões expiradas e, acima dos limites, as menos usadas, nunca a sessão `keep`."""
+        # Como a ordem é LRU, as sessões expiradas estão sempre no início
+        if self.ttl_seconds > 0:
+            deadline = self._clock() - self.ttl_seconds
+            while self._sessions:
+                oldest = next(iter(self._sessions))
+                if self._last_access[oldest] > deadline:
+                    break
+                self._remove(oldest)
+        # Uma sessão que sozinha passa do limite encolhe em vez de despejar as demais
+        if keep in self._sessions and self._sizes[keep] > self.max_bytes:
+            self._trim_history(keep)
+        while len(self._sessions) > self.max_entries or self._total_bytes > self.max_bytes:
+            oldest = next((sid for sid in self._sessions if sid != keep), None)
+            if oldest is None:
+                break
+            log_event("session_evicted", sessionId=oldest)
+            self._remove(oldest)
+
+    def _trim_history(self, session_id):
+        """Descarta as trocas mais antigas da sessão até caber no limite de memória, mantendo a última.
+
+        O resumo do contexto (conversation_context) continua valendo para o que
+        foi descartado; seu índice de cobertura é deslocado junto.
+        """
+        session = self._sessions[session_id]
+        history = session["history"]
+        excess = self._sizes[session_id] - self.max_bytes
+        dropped = 0
+        while excess > 0 and len(history) - dropped > 2:
+            excess -= _estimate_message_bytes(history[dropped]) + _estimate_message_bytes(history[dropped + 1])
+            dropped += 2
+        if not dropped:
+            return
+        del history[:dropped]
+        summary = session["summary"]
+        summary["covered"] = max(0, summary.get("covered", 0) - dropped)
+        self._resize(session_id)
+        log_event("session_history_trimmed", sessionId=session_id, droppedTurns=dropped // 2)
+
+    def _lookup(self, session_id):
+        self._evict(keep=session_id)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._touch(session_id)
+        return session
+
+    def create(self, session_id, mode, topic):
+        with self._lock:
+            self._sessions[session_id] = {
+                "history": [],
+                "mode": mode,
+                "topic": topic,
+                "scores": _empty_scores(),
+                "topic_scores": {},
+                "summary": _empty_summary(),
+            }
+            self._touch(session_id)
+            self._resize(session_id)
+            self._evict(keep=session_id)
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                return None
+            return {
+                "history": list(session["history"]),
+                "mode": session["mode"],
+                "topic": session["topic"],
+                "scores": dict(session["scores"]),
+                "summary": dict(session["summary"]),
+            }
+
+    def get_state(self, session_id):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                return None
+            return {
+                "mode": session["mode"],
+                "topic": session["topic"],
+                "scores": dict(session["scores"]),
+                "topicScores": {topic: dict(scores) for topic, scores in session["topic_scores"].items()},
+            }
+
+    def update(self, session_id, mode=None, topic=None, summary=None):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                return False
+            if mode is not None:
+                session["mode"] = mode
+            if topic is not None:
+                session["topic"] = topic
+            if summary is not None:
+                session["summary"] = dict(summary)
+                self._resize(session_id)
+            return True
+
+    def append_history(self, session_id, messages):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                return False
+            session["history"].extend(messages)
+            self._resize(session_id)
+            self._evict(keep=session_id)
+            return True
+
+    def increment_score(self, session_id, is_correct, topic=None):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                return None
+            targets = [session["scores"]]
+            if topic is not None:
+                targets.append(session["topic_scores"].setdefault(topic, _empty_scores()))
+            for scores in targets:
+                scores["total"] += 1
+                if is_correct:
+                    scores["correct"] += 1
+            return dict(session["scores"])
+
+    def get_scores(self, session_id):
+        with self._lock:
+            session = self._lookup(session_id)
+            return dict(session["scores"]) if session is not None else None
+
+    def delete(self, session_id):
+        with self._lock:
+            self._remove(session_id)
+
+    def count(self):
+        with self._lock:
+            self._evict()
+            return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._sessions), "approxBytes": self._total_bytes}
+
+
+class SQLiteSessionStore(SessionStore):
+    # Intervalo mínimo entre varreduras de sessões expiradas
+    PURGE_INTERVAL_SECONDS = 60
+    # Leituras só regravam last_access se ele tiver mais que isso; a sessão pode
+    # expirar até esse tanto antes do TTL, em troca de leituras sem escrita
+    TOUCH_INTERVAL_SECONDS = 60
+
+    def __init__(self, path=SESSION_DB_PATH, ttl_seconds=SESSION_TTL_SECONDS, clock=time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " mode TEXT,"
+                " topic TEXT,"
+                " correct INTEGER NOT NULL DEFAULT 0,"
+                " total INTEGER NOT NULL DEFAULT 0,"
+                " summary TEXT NOT NULL DEFAULT '{}',"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_messages ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,"
+                " role TEXT NOT NULL,"
+                " text TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_topic_scores ("
+                " session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,"
+                " topic TEXT NOT NULL,"
+                " correct INTEGER NOT NULL DEFAULT 0,"
+                " total INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (session_id, topic))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON session_messages(session_id, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+
+    def _conn(self):
+        # Uma conexão por thread; o SQLite em WAL permite leitores concorrentes com um escritor
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, write=True):
+        conn = self._conn()
+        # IMMEDIATE reserva a escrita logo no início e evita deadlocks entre processos;
+        # leituras usam uma transação adiada, que em WAL não bloqueia nem espera escritores
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _alive_since(self):
+        return self._clock() - self.ttl_seconds if self.ttl_seconds > 0 else float("-inf")
+
+    def _maybe_purge(self):
+        now = self._clock()
+        if self.ttl_seconds <= 0 or now - self._last_purge < self.PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE last_access < ?", (self._alive_since(),))
+
+    def _touch(self, conn, session_id):
+        cursor = conn.execute(
+            "UPDATE sessions SET last_access = ? WHERE id = ? AND last_access >= ?",
+            (self._clock(), session_id, self._alive_since()),
+        )
+        return cursor.rowcount > 0
+
+    def _read_session(self, conn, session_id, columns):
+        """Lê colunas de uma sessão ativa (ou None), guardando o last_access para _touch_if_stale."""
+        return conn.execute(
+            f"SELECT {columns}, last_access FROM sessions WHERE id = ? AND last_access >= ?",
+            (session_id, self._alive_since()),
+        ).fetchone()
+
+    def _touch_if_stale(self, session_id, last_access):
+        # Fora da transação de leitura: a escrita só acontece uma vez por intervalo
+        now = self._clock()
+        if now - last_access < self.TOUCH_INTERVAL_SECONDS:
+            return
+        self._conn().execute(
+            "UPDATE sessions SET last_access = ? WHERE id = ? AND last_access < ?",
+            (now, session_id, now - self.TOUCH_INTERVAL_SECONDS),
+        )
+
+    def create(self, session_id, mode, topic):
+        self._maybe_purge()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, mode, topic, correct, total, summary, last_access)"
+                " VALUES (?, ?, ?, 0, 0, ?, ?)",
+                (session_id, mode, topic, json.dumps(_empty_summary()), self._clock()),
+            )
+
+    def get(self, session_id):
+        self._maybe_purge()
+        with self._transaction(write=False) as conn:
+            row = self._read_session(conn, session_id, "mode, topic, correct, total, summary")
+            if row is None:
+                return None
+            mode, topic, correct, total, summary, last_access = row
+            history = [
+                {"role": role, "parts": [{"text": text}]}
+                for role, text in conn.execute(
+                    "SELECT role, text FROM session_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+                )
+            ]
+        self._touch_if_stale(session_id, last_access)
+        return {
+            "history": history,
+            "mode": mode,
+            "topic": topic,
+            "scores": {"correct": correct, "total": total},
+            "summary": json.loads(summary) or _empty_summary(),
+        }
+
+    def get_state(self, session_id):
+        with self._transaction(write=False) as conn:
+            row = self._read_session(conn, session_id, "mode, topic, correct, total")
+            if row is None:
+                return None
+            mode, topic, correct, total, last_access = row
+            topic_scores = {
+                row_topic: {"correct": row_correct, "total": row_total}
+                for row_topic, row_correct, row_total in conn.execute(
+                    "SELECT topic, correct, total FROM session_topic_scores WHERE session_id = ?", (session_id,)
+                )
+            }
+        self._touch_if_stale(session_id, last_access)
+        return {
+            "mode": mode,
+            "topic": topic,
+            "scores": {"correct": correct, "total": total},
+            "topicScores": topic_scores,
+        }
+
+    def update(self, session_id, mode=None, topic=None, summary=None):
+        with self._transaction() as conn:
+            if not self._touch(conn, session_id):
+                return False
+            if mode is not None:
+                conn.execute("UPDATE sessions SET mode = ? WHERE id = ?", (mode, session_id))
+            if topic is not None:
+                conn.execute("UPDATE sessions SET topic = ? WHERE id = ?", (topic, session_id))
+            if summary is not None:
+                conn.execute("UPDATE sessions SET summary = ? WHERE id = ?", (json.dumps(summary), session_id))
+            return True
+
+    def append_history(self, session_id, messages):
+        with self._transaction() as conn:
+            if not self._touch(conn, session_id):
+                return False
+            conn.executemany(
+                "INSERT INTO session_messages (session_id, role, text) VALUES (?, ?, ?)",
+                [
+                    (session_id, m["role"], "".join(p.get("text", "") for p in m.get("parts", [])))
+                    for m in messages
+                ],
+            )
+            return True
+
+    def increment_score(self, session_id, is_correct, topic=None):
+        with self._transaction() as conn:
+            if not self._touch(conn, session_id):
+                return None
+            correct_increment = 1 if is_correct else 0
+            conn.execute(
+                "UPDATE sessions SET total = total + 1, correct = correct + ? WHERE id = ?",
+                (correct_increment, session_id),
+            )
+            if topic is not None:
+                conn.execute(
+                    "INSERT INTO session_topic_scores (session_id, topic, correct, total) VALUES (?, ?, ?, 1)"
+                    " ON CONFLICT (session_id, topic) DO UPDATE"
+                    " SET correct = correct + excluded.correct, total = total + 1",
+                    (session_id, topic, correct_increment),
+                )
+            correct, total = conn.execute(
+                "SELECT correct, total FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return {"correct": correct, "total": total}
+
+    def get_scores(self, session_id):
+        # Uma única consulta dispensa transação explícita
+        row = self._read_session(self._conn(), session_id, "correct, total")
+        if row is None:
+            return None
+        correct, total, last_access = row
+        self._touch_if_stale(session_id, last_access)
+        return {"correct": correct, "total": total}
+
+    def delete(self, session_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def count(self):
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_access >= ?", (self._alive_since(),)
+        ).fetchone()
+        return row[0]
+
+    def stats(self):
+        return {"backend": "sqlite", "sessions": self.count(), "path": self.path}
+
+
+def create_session_store(backend=None):
+    """Cria o backend configurado pela variável de ambiente SESSION_STORE (memory ou sqlite)."""
+    backend = (backend or SESSION_STORE_BACKEND).lower()
+    if backend == "sqlite":
+        print(f"Sessões armazenadas em SQLite (WAL): {SESSION_DB_PATH}")
+        return SQLiteSessionStore()
+    if backend != "memory":
+        print(f"AVISO: backend de sessão desconhecido '{backend}', usando memória.")
+    return MemorySessionStore()
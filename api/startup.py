@@ -0,0 +1,47 @@
+# Medições de inicialização da função serverless.
+#
+# Registra quanto tempo cada import pesado levou, quando o módulo terminou de
+# carregar, quando chegou a primeira requisição e quando o Gemini foi
+# inicializado. Os tempos são relativos ao carregamento deste módulo, que deve
+# ser o primeiro import de index.py.
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+_lock = threading.Lock()
+import_timings = {}  # rótulo -> milissegundos
+events = {}  # evento -> milissegundos desde PROCESS_START
+
+
+def _elapsed_ms(since):
+    return round((time.perf_counter() - since) * 1000, 2)
+
+
+@contextmanager
+def timed(label):
+    """Mede o bloco (normalmente um import) e guarda o tempo em import_timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            import_timings[label] = _elapsed_ms(start)
+
+
+def mark(event):
+    """Registra o instante de um evento apenas na primeira vez em que ocorre."""
+    if event in events:
+        return
+    with _lock:
+        events.setdefault(event, _elapsed_ms(PROCESS_START))
+
+
+def report():
+    with _lock:
+        return {
+            "imports": dict(import_timings),
+            "events": dict(events),
+            "uptimeMs": _elapsed_ms(PROCESS_START),
+        }
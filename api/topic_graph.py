@@ -0,0 +1,166 @@
+# Grafo da trilha de aprendizagem, carregado uma única vez de learning_topics.json.
+#
+# Na carga o grafo é validado (campos obrigatórios, referências existentes,
+# ausência de ciclos) e tudo o que as rotas precisam é pré-calculado: ordem
+# topológica, pré-requisitos diretos e transitivos, tópicos alcançáveis, as
+# recomendações de próximo tópico e o JSON já serializado com seu ETag.
+import hashlib
+import heapq
+import json
+import os
+
+TOPICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "learning_topics.json")
+
+# Com pelo menos REVIEW_MIN_EXERCISES exercícios e aproveitamento abaixo de
+# REVIEW_THRESHOLD, a recomendação passa a ser revisar o tópico atual.
+REVIEW_MIN_EXERCISES = int(os.getenv("REVIEW_MIN_EXERCISES", "3"))
+REVIEW_THRESHOLD = float(os.getenv("REVIEW_THRESHOLD", "0.6"))
+
+
+class TopicGraphError(ValueError):
+    """O arquivo de tópicos é inválido (campo ausente, referência inexistente ou ciclo)."""
+
+
+class TopicGraph:
+    def __init__(self, raw_topics):
+        if not isinstance(raw_topics, dict) or not raw_topics:
+            raise TopicGraphError("O arquivo de tópicos deve ser um objeto JSON não vazio.")
+
+        declared = list(raw_topics)
+        self.successors = {}
+        for key, topic in raw_topics.items():
+            if not isinstance(topic, dict):
+                raise TopicGraphError(f"Tópico '{key}' deve ser um objeto.")
+            for field in ("name", "description"):
+                if not isinstance(topic.get(field), str) or not topic[field].strip():
+                    raise TopicGraphError(f"Tópico '{key}' sem o campo '{field}'.")
+            next_topics = topic.get("next_topics") or []
+            if not isinstance(next_topics, list):
+                raise TopicGraphError(f"Tópico '{key}': 'next_topics' deve ser uma lista ou null.")
+            for target in next_topics:
+                if target not in raw_topics:
+                    raise TopicGraphError(f"Tópico '{key}' aponta para tópico inexistente '{target}'.")
+                if target == key:
+                    raise TopicGraphError(f"Tópico '{key}' aponta para si mesmo.")
+            self.successors[key] = tuple(dict.fromkeys(next_topics))
+
+        self.predecessors = {key: [] for key in declared}
+        for key in declared:
+            for target in self.successors[key]:
+                self.predecessors[target].append(key)
+
+        self.order = self._topological_order(declared)
+        self.position = {key: i for i, key in enumerate(self.order)}
+        self.predecessors = {
+            key: tuple(sorted(preds, key=self.position.get)) for key, preds in self.predecessors.items()
+        }
+        self.roots = tuple(key for key in self.order if not self.predecessors[key])
+
+        # Pré-requisitos transitivos (em ordem topológica) e tópicos alcançáveis (em ordem inversa)
+        self.ancestors = {}
+        for key in self.order:
+            ancestors = set(self.predecessors[key])
+            for pred in self.predecessors[key]:
+                ancestors |= self.ancestors[pred]
+            self.ancestors[key] = frozenset(ancestors)
+        self.descendants = {}
+        for key in reversed(self.order):
+            descendants = set(self.successors[key])
+            for succ in self.successors[key]:
+                descendants |= self.descendants[succ]
+            self.descendants[key] = frozenset(descendants)
+
+        self.topics = {
+            key: {
+                "name": raw_topics[key]["name"],
+                "description": raw_topics[key]["description"],
+                # Compatibilidade com clientes que usam o campo linear "next": segue a
+                # ordem topológica, que percorre todos os tópicos um a um
+                "next": self.order[i + 1] if i + 1 < len(self.order) else None,
+                "next_topics": list(self.successors[key]),
+                "prerequisites": list(self.predecessors[key]),
+            }
+            for i, key in enumerate(self.order)
+        }
+
+        self._advance = {key: self._rank_next(key) for key in self.order}
+        self._review = {
+            key: [self._entry(key, "review")] + [self._entry(pred, "review") for pred in self.predecessors[key]]
+            for key in self.order
+        }
+
+        self.payload = json.dumps(self.topics, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = hashlib.sha256(self.payload).hexdigest()[:32]
+
+    def _topological_order(self, declared):
+        # Kahn com desempate pela ordem de declaração no arquivo, para uma ordem estável
+        declared_index = {key: i for i, key in enumerate(declared)}
+        in_degree = {key: len(self.predecessors[key]) for key in declared}
+        heap = [(declared_index[key], key) for key in declared if in_degree[key] == 0]
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            _, key = heapq.heappop(heap)
+            order.append(key)
+            for target in self.successors[key]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    heapq.heappush(heap, (declared_index[target], target))
+        if len(order) != len(declared):
+            cyclic = sorted(key for key in declared if in_degree[key] > 0)
+            raise TopicGraphError(f"Ciclo na trilha de aprendizagem envolvendo: {', '.join(cyclic)}.")
+        return order
+
+    def _entry(self, key, reason, missing=()):
+        return {
+            "topic": key,
+            "name": self.topics[key]["name"],
+            "reason": reason,
+            "missingPrerequisites": list(missing),
+        }
+
+    def _rank_next(self, current):
+        """Próximos tópicos, primeiro os que têm todos os pré-requisitos cobertos pelo caminho atual."""
+        covered = self.ancestors[current] | {current}
+        ranked = []
+        for succ in self.successors[current]:
+            missing = [pred for pred in self.predecessors[succ] if pred not in covered]
+            ranked.append((bool(missing), self.position[succ], succ, missing))
+        ranked.sort()
+        return [self._entry(succ, "advance", missing) for _, _, succ, missing in ranked]
+
+    def __contains__(self, key):
+        return key in self.topics
+
+    def recommend(self, current_topic, scores=None):
+        """Recomenda próximos tópicos a partir do tópico atual e do placar do aluno nesse tópico.
+
+        `scores` é o placar ({"correct", "total"}) só do tópico atual, para que
+        erros em outros tópicos não mandem revisar um tópico nunca tentado.
+        Tudo já foi pré-calculado na carga do grafo; aqui só se escolhe a lista.
+        """
+        if current_topic not in self.topics:
+            current_topic = self.roots[0]
+        correct = (scores or {}).get("correct", 0)
+        total = (scores or {}).get("total", 0)
+        accuracy = correct / total if total else None
+
+        if accuracy is not None and total >= REVIEW_MIN_EXERCISES and accuracy < REVIEW_THRESHOLD:
+            action, recommendations = "review", self._review[current_topic]
+        elif self._advance[current_topic]:
+            action, recommendations = "advance", self._advance[current_topic]
+        else:
+            action, recommendations = "completed", []
+
+        return {
+            "currentTopic": current_topic,
+            "action": action,
+            "accuracy": round(accuracy, 4) if accuracy is not None else None,
+            "recommendations": recommendations,
+            "remainingTopics": len(self.descendants[current_topic]),
+        }
+
+
+def load_topic_graph(path=TOPICS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return TopicGraph(json.load(f))
@@ -0,0 +1,322 @@
+# Camada de execução das chamadas ao Gemini.
+#
+# As chamadas ao modelo rodam num pool de threads com concorrência máxima
+# configurável, em vez de bloquear livremente as threads do Flask:
+#   - fila de espera limitada: quando cheia, a chamada falha na hora (503);
+#   - timeout por chamada (504), repassado ao SDK como prazo da requisição para
+#     que a chamada seja de fato interrompida e libere sua vaga;
+#   - novas tentativas com backoff exponencial e jitter para 429/503 do Gemini;
+#   - coalescência: prompts idênticos em andamento compartilham uma única chamada.
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from observability import log_error
+
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "32"))
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "60"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", "0.5"))
+UPSTREAM_BACKOFF_MAX_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", "8"))
+
+
+def retryable_errors():
+    """Erros transitórios do Gemini (429 e 503) que valem uma nova tentativa.
+
+    Importado sob demanda para não carregar google.api_core na inicialização.
+    """
+    from google.api_core import exceptions
+    return (exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.ServiceUnavailable)
+
+
+def deadline_errors():
+    """Erro levantado pelo SDK quando o prazo passado em request_options se esgota."""
+    from google.api_core import exceptions
+    return (exceptions.DeadlineExceeded,)
+
+
+class UpstreamSaturated(Exception):
+    """Todas as vagas de execução e da fila de espera estão ocupadas."""
+
+
+class UpstreamTimeout(Exception):
+    """A chamada ao Gemini não terminou dentro do tempo limite."""
+
+
+class UpstreamIncomplete(Exception):
+    """O stream terminou antes da hora (ex.: interrompido por SAFETY ou RECITATION)."""
+
+    def __init__(self, reason):
+        super().__init__(f"Resposta do Gemini interrompida (finish_reason={reason}).")
+        self.reason = reason
+
+
+# Motivos de término de uma resposta completa; None cobre trechos sem candidatos
+COMPLETE_FINISH_REASONS = (None, "STOP", "FINISH_REASON_UNSPECIFIED", "MAX_TOKENS")
+
+
+def finish_reason(chunk):
+    """Nome do finish_reason do primeiro candidato do trecho, ou None se não houver."""
+    candidates = getattr(chunk, "candidates", None)
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], "finish_reason", None)
+    if reason is None:
+        return None
+    return getattr(reason, "name", str(reason))
+
+
+class GeminiClient:
+    def __init__(self, get_model, max_concurrency=UPSTREAM_MAX_CONCURRENCY, max_queue=UPSTREAM_MAX_QUEUE,
+                 timeout=UPSTREAM_TIMEOUT_SECONDS, max_retries=UPSTREAM_MAX_RETRIES,
+                 backoff_base=UPSTREAM_BACKOFF_BASE_SECONDS, backoff_max=UPSTREAM_BACKOFF_MAX_SECONDS,
+                 on_call=None):
+        # get_model é uma função para que o modelo possa ser (re)configurado depois
+        self._get_model = get_model
+        # on_call(operação, segundos, exceção ou None) é chamado a cada tentativa ao Gemini
+        self._on_call = on_call
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        # Limita as chamadas simultâneas ao Gemini, inclusive as de streaming
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # RLock: callbacks de Futures já concluídos rodam na própria thread que os registra
+        self._lock = threading.RLock()
+        self._pending = 0  # chamadas em execução + aguardando vaga
+        self._inflight = {}  # chave do prompt -> Future compartilhado
+        self.coalesced = 0
+        self.rejected = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    # --- Controle de admissão -------------------------------------------------
+
+    def _admit_locked(self):
+        # Chamado com self._lock adquirido
+        if self._pending >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise UpstreamSaturated("Limite de chamadas simultâneas ao Gemini atingido.")
+        self._pending += 1
+
+    def _admit(self):
+        with self._lock:
+            self._admit_locked()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _timed_out(self, message=None):
+        with self._lock:
+            self.timeouts += 1
+        return UpstreamTimeout(message or f"O Gemini não respondeu em {self.timeout:g}s.")
+
+    def _backoff(self, attempt):
+        # "Full jitter": espera aleatória entre 0 e o teto exponencial
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        time.sleep(random.uniform(0, ceiling))
+
+    def _observe(self, operation, started, error):
+        if self._on_call is not None:
+            try:
+                self._on_call(operation, time.perf_counter() - started, error)
+            except Exception as e:
+                log_error("upstream_observer_failed", e)
+
+    def _timed(self, operation, call):
+        started = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            self._observe(operation, started, e)
+            raise
+        self._observe(operation, started, None)
+        return result
+
+    def _with_retries(self, call, operation, deadline):
+        """Executa call(segundos_restantes) com novas tentativas, sem ultrapassar o prazo."""
+        retryable = retryable_errors()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._timed_out()
+            try:
+                return self._timed(operation, lambda: call(remaining))
+            except deadline_errors() as e:
+                raise self._timed_out() from e
+            except retryable as e:
+                if attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                log_error("upstream_retry", e, level="warning", operation=operation, code=getattr(e, "code", None),
+                          attempt=attempt + 1, maxRetries=self.max_retries)
+                self._backoff(attempt)
+                attempt += 1
+
+    def _run(self, operation, call, deadline):
+        with self._slots:
+            return self._with_retries(call, operation, deadline)
+
+    def _submit(self, key, operation, call):
+        """Executa `call` no pool, compartilhando o resultado com chamadas idênticas em andamento."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self._admit_locked()
+                # O prazo conta desde a entrada na fila, como a espera de quem chamou
+                deadline = time.monotonic() + self.timeout
+                # Copia o contexto (ex.: ID da requisição) para a thread do pool
+                future = self._executor.submit(
+                    contextvars.copy_context().run, self._run, operation, call, deadline
+                )
+                self._inflight[key] = future
+                future.add_done_callback(lambda f: self._finish(key, f))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                # Prompts idênticos que chegarem depois não devem se juntar a uma chamada vencida
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            raise self._timed_out()
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._pending -= 1
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # --- API pública -----------------------------------------------------------
+
+    def send_message(self, history, prompt):
+        """Envia `prompt` com o histórico informado e retorna o texto da resposta."""
+        key = hashlib.sha256(
+            json.dumps([history, prompt], ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        def call(timeout):
+            chat_session = self._get_model().start_chat(history=history)
+            return chat_session.send_message(prompt, request_options={"timeout": timeout}).text
+
+        return self._submit(key, "send_message", call)
+
+    def generate(self, prompt):
+        """Geração simples, sem histórico (usada, por exemplo, para resumos)."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return self._submit(
+            key, "generate",
+            lambda timeout: self._get_model().generate_content(prompt, request_options={"timeout": timeout}).text,
+        )
+
+    def stream_message(self, history, prompt):
+        """Abre uma chamada em streaming e retorna um UpstreamStream com os trechos de texto.
+
+        A admissão acontece aqui, antes de qualquer trecho: sem vaga nem lugar
+        na fila, UpstreamSaturated é levantado na hora. O stream retornado
+        precisa ser consumido até o fim ou fechado com close() para liberar a
+        admissão.
+        """
+        self._admit()
+        return UpstreamStream(self._stream_chunks(history, prompt), self._release)
+
+    def _stream_chunks(self, history, prompt):
+        # Ocupa uma vaga de execução enquanto o stream estiver aberto. As novas
+        # tentativas só acontecem antes do primeiro trecho ser enviado ao cliente.
+        # O prazo vale para a chamada inteira, inclusive a leitura dos trechos.
+        deadline = time.monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise self._timed_out(f"Nenhuma vaga para chamar o Gemini em {self.timeout:g}s.")
+        try:
+            def call(timeout):
+                chat_session = self._get_model().start_chat(history=history)
+                return chat_session.send_message(prompt, stream=True, request_options={"timeout": timeout})
+
+            response = self._with_retries(call, "stream_open", deadline)
+            # A abertura é registrada à parte ("stream_open"); aqui só a leitura dos trechos
+            started = time.perf_counter()
+            try:
+                last_chunk = None
+                for chunk in response:
+                    last_chunk = chunk
+                    try:
+                        chunk_text = chunk.text
+                    except ValueError:
+                        # Trechos sem texto (ex.: apenas metadados) não vão ao cliente; o
+                        # motivo de término é conferido ao final
+                        continue
+                    if chunk_text:
+                        yield chunk_text
+                # Com stream=True o SDK não confere o finish_reason; sem isso uma resposta
+                # cortada por SAFETY ou RECITATION pareceria completa
+                reason = finish_reason(last_chunk)
+                if reason not in COMPLETE_FINISH_REASONS:
+                    raise UpstreamIncomplete(reason)
+            except deadline_errors() as e:
+                self._observe("stream", started, e)
+                raise self._timed_out() from e
+            except Exception as e:
+                self._observe("stream", started, e)
+                raise
+            self._observe("stream", started, None)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "maxConcurrency": self.max_concurrency,
+                "maxQueue": self.max_queue,
+                "pending": self._pending,
+                "inflightUnique": len(self._inflight),
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+            }
+
+
+class UpstreamStream:
+    """Iterador dos trechos de uma chamada em streaming já admitida.
+
+    A admissão é liberada uma única vez: ao fim da iteração, num erro ou em
+    close(), que pode ser chamado mesmo que o stream nunca tenha sido lido
+    (ex.: o cliente desconectou antes do primeiro trecho).
+    """
+
+    def __init__(self, chunks, release):
+        self._chunks = chunks
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self._chunks.close()
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
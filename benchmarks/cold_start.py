@@ -0,0 +1,122 @@
+"""Benchmark de cold start da API (api/index.py).
+
+Cada execução roda num processo Python novo, como uma instância serverless
+recém-criada, e mede:
+  - o tempo de import do módulo index (e o detalhamento por import pesado);
+  - a latência da primeira requisição a uma rota sem LLM;
+  - opcionalmente, o tempo do /api/warmup (import do SDK + configuração do Gemini,
+    sem chamar o modelo);
+  - se o SDK do Gemini foi carregado antes de ser necessário.
+
+Uso:
+    python benchmarks/cold_start.py --runs 10
+    python benchmarks/cold_start.py --runs 10 --route /api/get-scores --warmup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+
+CHILD_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {api_dir!r})
+import index
+import_ms = (time.perf_counter() - t0) * 1000
+client = index.app.test_client()
+t1 = time.perf_counter()
+response = client.get({route!r})
+first_request_ms = (time.perf_counter() - t1) * 1000
+sdk_loaded_early = "google.generativeai" in sys.modules
+result = {{
+    "importMs": import_ms,
+    "firstRequestMs": first_request_ms,
+    "firstRequestStatus": response.status_code,
+    "sdkLoadedBeforeNeeded": sdk_loaded_early,
+}}
+if {warmup!r}:
+    t2 = time.perf_counter()
+    client.post("/api/warmup")
+    result["warmupMs"] = (time.perf_counter() - t2) * 1000
+result["startup"] = index.startup.report()
+print("__RESULT__" + json.dumps(result))
+"""
+
+
+def run_once(route, warmup, env):
+    script = CHILD_SCRIPT.format(api_dir=os.path.abspath(API_DIR), route=route, warmup=warmup)
+    completed = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, env=env, check=False
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("__RESULT__"):
+            return json.loads(line[len("__RESULT__"):])
+    raise RuntimeError(f"Execução falhou:\n{completed.stdout}\n{completed.stderr}")
+
+
+def summarize(values):
+    values = sorted(values)
+    p95_index = max(0, int(round(0.95 * len(values))) - 1)
+    return {
+        "min": round(values[0], 2),
+        "median": round(statistics.median(values), 2),
+        "p95": round(values[p95_index], 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede import e primeira requisição da API em processos novos.")
+    parser.add_argument("--runs", type=int, default=10, help="número de processos novos (default: 10)")
+    parser.add_argument("--route", default="/api/get-learning-topics", help="rota GET sem LLM para a primeira requisição")
+    parser.add_argument("--warmup", action="store_true", help="mede também o /api/warmup após a primeira requisição")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado completo em JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.runs):
+            env = dict(os.environ)
+            # Arquivos SQLite isolados por execução, para não reaproveitar estado entre rodadas
+            env.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+            env["SESSION_DB_PATH"] = os.path.join(tmp, f"sessions-{i}.db")
+            env["FEEDBACK_DB_PATH"] = os.path.join(tmp, f"feedback-{i}.db")
+            env["RESPONSE_CACHE_DISK_PATH"] = os.path.join(tmp, f"cache-{i}.db")
+            results.append(run_once(args.route, args.warmup, env))
+
+    report = {
+        "runs": args.runs,
+        "route": args.route,
+        "importMs": summarize([r["importMs"] for r in results]),
+        "firstRequestMs": summarize([r["firstRequestMs"] for r in results]),
+        "sdkLoadedBeforeNeeded": any(r["sdkLoadedBeforeNeeded"] for r in results),
+        "importBreakdownMs": {
+            label: round(statistics.median(r["startup"]["imports"].get(label, 0.0) for r in results), 2)
+            for label in results[0]["startup"]["imports"]
+        },
+    }
+    if args.warmup:
+        report["warmupMs"] = summarize([r["warmupMs"] for r in results])
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"Execuções: {report['runs']}  rota: {report['route']}")
+    for key in ("importMs", "firstRequestMs", "warmupMs"):
+        if key in report:
+            stats = report[key]
+            print(f"  {key:<16} min={stats['min']:>8} mediana={stats['median']:>8} p95={stats['p95']:>8} max={stats['max']:>8}")
+    print(f"  SDK do Gemini carregado antes de ser necessário: {'sim' if report['sdkLoadedBeforeNeeded'] else 'não'}")
+    print("  Imports (mediana, ms):")
+    for label, ms in report["importBreakdownMs"].items():
+        print(f"    {label:<22} {ms}")
+
+
+if __name__ == "__main__":
+    main()
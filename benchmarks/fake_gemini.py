@@ -0,0 +1,151 @@
+"""Modelo Gemini local para benchmarks, sem acesso à rede.
+
+Imita a interface usada pela API (start_chat().send_message(), com e sem
+stream, e generate_content()) com latência, tamanho de resposta e injeção de
+falhas configuráveis: erros 429, erros 500 e prompts bloqueados. O prazo de
+request_options={"timeout": ...} é respeitado como no SDK (DeadlineExceeded).
+As exceções levantadas são as mesmas do SDK real, então os tratamentos de erro
+das rotas são exercitados de verdade.
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core import exceptions
+import google.generativeai as genai
+
+FILLER = (
+    "Flexbox organiza itens em uma linha ou coluna. Use display: flex no container, "
+    "justify-content para o eixo principal e align-items para o eixo cruzado. "
+)
+EXERCISE_TAIL = " Exercício: crie um container com três itens centralizados."
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _timeout_of(request_options):
+    return (request_options or {}).get("timeout")
+
+
+def _sleep_until(seconds, deadline):
+    """Dorme `seconds`, ou até o prazo, levantando DeadlineExceeded se ele vencer antes."""
+    if deadline is not None and time.monotonic() + seconds > deadline:
+        time.sleep(max(0.0, deadline - time.monotonic()))
+        raise exceptions.DeadlineExceeded("Simulação: prazo da requisição esgotado.")
+    time.sleep(seconds)
+
+
+class FakeStreamResponse:
+    def __init__(self, chunks, delays, deadline=None):
+        self._chunks = chunks
+        self._delays = delays
+        self._deadline = deadline
+
+    def __iter__(self):
+        for chunk, delay in zip(self._chunks, self._delays):
+            _sleep_until(delay, self._deadline)
+            yield FakeChunk(chunk)
+
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self._model = model
+        self.history = list(history or [])
+
+    def send_message(self, prompt, stream=False, request_options=None):
+        return self._model._respond(prompt, stream, history_len=len(self.history),
+                                    timeout=_timeout_of(request_options))
+
+
+class FakeGeminiModel:
+    def __init__(self, latency_ms=800, jitter_ms=200, first_chunk_ms=150, response_chars=1200,
+                 chunk_chars=80, exercise_ratio=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 blocked_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.first_chunk_ms = first_chunk_ms
+        self.response_chars = response_chars
+        self.chunk_chars = chunk_chars
+        self.exercise_ratio = exercise_ratio
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.blocked_rate = blocked_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.history_messages_received = 0
+        self.faults = {"rate_limited": 0, "errors": 0, "blocked": 0}
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        return self._respond(prompt, stream, history_len=0, timeout=_timeout_of(request_options))
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random(), self._random.random(), self._random.uniform(-1, 1)
+
+    def _fault(self, roll):
+        # Faixas acumuladas: [429 | 500 | bloqueado | sucesso]
+        if roll < self.rate_limit_rate:
+            self._count_fault("rate_limited")
+            raise exceptions.TooManyRequests("Simulação: cota do Gemini excedida.")
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            self._count_fault("errors")
+            raise exceptions.InternalServerError("Simulação: erro interno do Gemini.")
+        roll -= self.error_rate
+        if roll < self.blocked_rate:
+            self._count_fault("blocked")
+            error = genai.types.BlockedPromptException("Simulação: prompt bloqueado.")
+            error.response = SimpleNamespace(
+                prompt_feedback=SimpleNamespace(block_reason=SimpleNamespace(name="SAFETY"))
+            )
+            raise error
+
+    def _count_fault(self, kind):
+        with self._lock:
+            self.faults[kind] += 1
+
+    def _text(self, with_exercise):
+        body = (FILLER * (self.response_chars // len(FILLER) + 1))[:self.response_chars]
+        return body + (EXERCISE_TAIL if with_exercise else "")
+
+    def _respond(self, prompt, stream, history_len, timeout=None):
+        with self._lock:
+            self.calls += 1
+            self.history_messages_received += history_len
+        fault_roll, exercise_roll, jitter = self._roll()
+        total_s = max(0.0, self.latency_ms + jitter * self.jitter_ms) / 1000
+        first_s = min(total_s, self.first_chunk_ms / 1000)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if stream:
+            # Assim como o SDK real, bloqueios e erros aparecem ao abrir o stream
+            _sleep_until(first_s, deadline)
+            self._fault(fault_roll)
+            text = self._text(exercise_roll < self.exercise_ratio)
+            chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+            per_chunk = (total_s - first_s) / max(1, len(chunks) - 1)
+            delays = [0.0] + [per_chunk] * (len(chunks) - 1)
+            return FakeStreamResponse(chunks, delays, deadline)
+        _sleep_until(total_s, deadline)
+        self._fault(fault_roll)
+        return FakeResponse(self._text(exercise_roll < self.exercise_ratio))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "avgHistoryMessages": round(self.history_messages_received / self.calls, 2) if self.calls else 0.0,
+                "faults": dict(self.faults),
+            }
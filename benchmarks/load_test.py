@@ -0,0 +1,301 @@
+"""Teste de carga offline da API contra um Gemini local (fake_gemini.py).
+
+Sobe o app Flask de api/index.py num servidor HTTP local com threads, troca o
+modelo Gemini pelo FakeGeminiModel e simula alunos executando fluxos completos:
+start-session, várias mensagens no chat (parte delas em streaming),
+exercise-evaluation, feedback e get-scores. Ao final mostra p50/p95/p99 por
+rota, requisições por segundo, códigos de status e a evolução do RSS do processo.
+No streaming, os eventos SSE são lidos: o status registrado é o desfecho do
+stream ("200 done", "200 error" ou "200 incompleto") e o tempo até o primeiro
+trecho ganha seus próprios p50/p95/p99.
+
+Exemplos:
+    python benchmarks/load_test.py --users 20 --sessions 5 --turns 8
+    python benchmarks/load_test.py --users 50 --latency-ms 1500 --rate-limit-rate 0.05 --blocked-rate 0.02
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(BENCH_DIR, "..", "api")
+
+QUESTIONS = [
+    "O que é flexbox?",
+    "Como centralizar uma div?",
+    "Qual a diferença entre margin e padding?",
+    "Para que serve o justify-content?",
+    "Como criar um formulário com label e input?",
+]
+FOLLOW_UPS = [
+    "Pode dar outro exemplo?",
+    "E se eu quiser alinhar na vertical?",
+    "Não entendi a parte do eixo cruzado.",
+    "Aqui está minha resposta: <div style='display:flex'>...</div>",
+]
+TOPICS = ["html_intro", "html_forms", "css_box_model", "css_flexbox", "css_grid"]
+MODES = ["iniciante", "intermediario", "avancado"]
+
+
+def current_rss_mb():
+    """RSS atual do processo em MB (Linux); fora do Linux usa o pico do getrusage."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.first_chunk = defaultdict(list)
+
+    def record(self, route, status, seconds, first_chunk_seconds=None):
+        with self._lock:
+            self.latencies[route].append(seconds * 1000)
+            self.statuses[route][status] += 1
+            if first_chunk_seconds is not None:
+                self.first_chunk[route].append(first_chunk_seconds * 1000)
+
+
+class ApiClient:
+    """Cliente HTTP mínimo; uma conexão keep-alive por aluno simulado."""
+
+    def __init__(self, port, recorder):
+        self._conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        self._recorder = recorder
+
+    def request(self, method, path, payload=None, route=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        start = time.perf_counter()
+        try:
+            self._conn.request(method, path, body=body, headers=headers)
+            response = self._conn.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            status, raw = "erro_conexao", b""
+        self._recorder.record(route or path.split("?")[0], status, time.perf_counter() - start)
+        if status == 200 and raw:
+            return json.loads(raw)
+        return None
+
+    def stream(self, path, payload, route=None):
+        """POST num endpoint SSE, medindo o tempo até o primeiro trecho e o desfecho do stream.
+
+        Falhas depois dos cabeçalhos (prompt bloqueado, erro do Gemini) chegam
+        como HTTP 200 com um evento "error", então o status sozinho não basta.
+        """
+        start = time.perf_counter()
+        first_chunk = None
+        outcome = "incompleto"
+        try:
+            self._conn.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
+            response = self._conn.getresponse()
+            status = response.status
+            if status == 200:
+                for raw_line in response:
+                    line = raw_line.decode("utf-8").rstrip("\r\n")
+                    if not line.startswith("event:"):
+                        continue
+                    event = line[len("event:"):].strip()
+                    if event == "chunk" and first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    elif event in ("done", "error"):
+                        outcome = event
+            else:
+                response.read()
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            status = "erro_conexao"
+        if status == 200:
+            status = f"200 {outcome}"
+        self._recorder.record(route or path, status, time.perf_counter() - start, first_chunk)
+
+    def close(self):
+        self._conn.close()
+
+
+def student_flow(port, recorder, args, rng):
+    client = ApiClient(port, recorder)
+    try:
+        for _ in range(args.sessions):
+            started = client.request("POST", "/api/start-session", {"userName": "bench", "userEmail": "bench@example.com"})
+            if not started:
+                continue
+            session_id = started["sessionId"]
+            topic, mode = rng.choice(TOPICS), rng.choice(MODES)
+            for turn in range(args.turns):
+                message = rng.choice(QUESTIONS) if turn == 0 else rng.choice(FOLLOW_UPS)
+                payload = {"message": message, "sessionId": session_id, "currentTopic": topic, "currentMode": mode}
+                if rng.random() < args.stream_ratio:
+                    client.stream("/api/chat/stream", payload)
+                else:
+                    client.request("POST", "/api/chat", payload)
+                if rng.random() < 0.3:
+                    client.request("POST", "/api/exercise-evaluation", {"sessionId": session_id, "isCorrect": rng.random() < 0.6})
+                if rng.random() < 0.2:
+                    client.request("POST", "/api/feedback", {
+                        "sessionId": session_id, "messageId": f"{session_id}-{turn}",
+                        "feedbackType": rng.choice(["like", "dislike"]), "messageText": "resposta do tutor",
+                        "currentTopic": topic, "currentMode": mode,
+                    })
+            client.request("GET", f"/api/get-scores?sessionId={session_id}")
+    finally:
+        client.close()
+
+
+def sample_rss(samples, stop, interval, started):
+    while not stop.wait(interval):
+        samples.append((time.perf_counter() - started, current_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API com um Gemini local simulado.")
+    parser.add_argument("--users", type=int, default=20, help="alunos simultâneos (default: 20)")
+    parser.add_argument("--sessions", type=int, default=3, help="sessões por aluno (default: 3)")
+    parser.add_argument("--turns", type=int, default=6, help="mensagens de chat por sessão (default: 6)")
+    parser.add_argument("--stream-ratio", type=float, default=0.3, help="fração das mensagens via /api/chat/stream")
+    parser.add_argument("--latency-ms", type=float, default=300, help="latência média do Gemini simulado")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="variação da latência (±)")
+    parser.add_argument("--first-chunk-ms", type=float, default=80, help="tempo até o primeiro trecho no streaming")
+    parser.add_argument("--response-chars", type=int, default=1200, help="tamanho das respostas simuladas")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de chamadas com erro 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fração de chamadas com erro 429")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="fração de prompts bloqueados")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="intervalo de amostragem do RSS (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="imprime o relatório completo em JSON")
+    args = parser.parse_args()
+
+    # Estado isolado por execução e chave fictícia para liberar as rotas de chat
+    tmp = tempfile.mkdtemp(prefix="tutor-bench-")
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join(tmp, "sessions.db"))
+    os.environ.setdefault("FEEDBACK_DB_PATH", os.path.join(tmp, "feedback.db"))
+    os.environ.setdefault("RESPONSE_CACHE_DISK_PATH", os.path.join(tmp, "cache.db"))
+    os.environ.setdefault("UPSTREAM_BACKOFF_BASE_SECONDS", "0.05")
+    sys.path.insert(0, os.path.abspath(API_DIR))
+    sys.path.insert(0, BENCH_DIR)
+
+    import index
+    from fake_gemini import FakeGeminiModel
+    from werkzeug.serving import make_server
+
+    fake = FakeGeminiModel(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, first_chunk_ms=args.first_chunk_ms,
+        response_chars=args.response_chars, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, blocked_rate=args.blocked_rate, seed=args.seed,
+    )
+    index.gemini_model = fake
+
+    server = make_server("127.0.0.1", 0, index.app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    recorder = Recorder()
+    rss_samples = [(0.0, current_rss_mb())]
+    stop = threading.Event()
+    started = time.perf_counter()
+    sampler = threading.Thread(target=sample_rss, args=(rss_samples, stop, args.rss_interval, started), daemon=True)
+    sampler.start()
+
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = [
+            pool.submit(student_flow, server.server_port, recorder, args, random.Random(args.seed + i))
+            for i in range(args.users)
+        ]
+        for future in futures:
+            future.result()
+
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+    rss_samples.append((elapsed, current_rss_mb()))
+    server.shutdown()
+
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    report = {
+        "config": vars(args),
+        "elapsedSeconds": round(elapsed, 2),
+        "requests": total_requests,
+        "requestsPerSecond": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "routes": {
+            route: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 2),
+                "p95": round(percentile(values, 95), 2),
+                "p99": round(percentile(values, 99), 2),
+                "statuses": {str(k): v for k, v in recorder.statuses[route].items()},
+            }
+            for route, values in sorted(recorder.latencies.items())
+        },
+        "firstChunkMs": {
+            route: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 2),
+                "p95": round(percentile(values, 95), 2),
+                "p99": round(percentile(values, 99), 2),
+            }
+            for route, values in sorted(recorder.first_chunk.items())
+        },
+        "rssMb": {
+            "start": round(rss_samples[0][1], 1),
+            "end": round(rss_samples[-1][1], 1),
+            "max": round(max(rss for _, rss in rss_samples), 1),
+            "growth": round(rss_samples[-1][1] - rss_samples[0][1], 1),
+            "samples": [(round(t, 1), round(rss, 1)) for t, rss in rss_samples],
+        },
+        "fakeGemini": fake.stats(),
+        "upstream": index.upstream_client.stats(),
+        "sessions": index.session_store.count(),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"\n{total_requests} requisições em {report['elapsedSeconds']} s -> {report['requestsPerSecond']} req/s")
+    print(f"{'rota':<28}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  status")
+    for route, stats in report["routes"].items():
+        print(f"{route:<28}{stats['count']:>7}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}  {stats['statuses']}")
+    if report["firstChunkMs"]:
+        print("\nTempo até o primeiro trecho (streams que receberam algum trecho):")
+        for route, stats in report["firstChunkMs"].items():
+            print(f"{route:<28}{stats['count']:>7}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}")
+    rss = report["rssMb"]
+    print(f"\nRSS (MB): início={rss['start']} fim={rss['end']} máx={rss['max']} crescimento={rss['growth']}")
+    print("Evolução do RSS (s, MB): " + ", ".join(f"({t}, {m})" for t, m in rss["samples"]))
+    print(f"Gemini simulado: {report['fakeGemini']}")
+    print(f"Upstream: {report['upstream']}")
+    print(f"Sessões ativas: {report['sessions']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -451,7 +451,7 @@ function App() {
       const response = await fetch('/api/feedback', { // ALTERADO: Caminho relativo
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ messageId, feedbackType, messageText, sessionId }),
+        body: JSON.stringify({ messageId, feedbackType, messageText, sessionId, currentTopic, currentMode }),
       });
 
       if (!response.ok) {
@@ -539,7 +539,7 @@ function App() {
       const response = await fetch('/api/exercise-evaluation', { // ALTERADO: Caminho relativo
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ sessionId, isCorrect }),
+        body: JSON.stringify({ sessionId, isCorrect, currentTopic }),
       });
 
       if (!response.ok) {
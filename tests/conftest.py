@@ -0,0 +1,6 @@
+# Os módulos do backend ficam em api/ e são importados pelo nome, como na
+# Vercel (PYTHONPATH=api). Rode com: python -m pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
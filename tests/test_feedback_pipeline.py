@@ -0,0 +1,55 @@
+import threading
+
+from feedback_pipeline import FeedbackPipeline
+
+
+def make_pipeline(tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 0.05)
+    return FeedbackPipeline(db_path=str(tmp_path / "feedback.db"), **kwargs)
+
+
+def submit_like(pipeline, topic="css_grid"):
+    pipeline.submit("s", "m", "like", "resposta", topic, "iniciante")
+
+
+def test_submit_does_not_wait_for_database_writes(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    done = threading.Event()
+
+    with pipeline._db_lock:  # simula um lote sendo gravado (ou o banco ocupado)
+        thread = threading.Thread(target=lambda: (submit_like(pipeline), done.set()))
+        thread.start()
+        assert done.wait(1), "submit ficou esperando a gravação no banco"
+    thread.join()
+    pipeline.close()
+
+
+def test_stats_merge_written_and_pending_events(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    submit_like(pipeline)
+    pipeline.flush()
+    submit_like(pipeline)
+    pipeline.submit("s", "m", "dislike", "resposta", "css_grid", "iniciante")
+
+    stats = pipeline.stats()
+    assert stats["totals"] == {"like": 2, "dislike": 1}
+    assert stats["byTopic"]["css_grid"] == {"like": 2, "dislike": 1}
+    pipeline.close()
+
+
+def test_failed_batch_is_kept_and_written_later(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    pipeline._conn.execute(
+        "CREATE TRIGGER falha BEFORE INSERT ON feedback_events BEGIN SELECT RAISE(ABORT, 'disco cheio'); END"
+    )
+    submit_like(pipeline)
+    pipeline.flush()
+    assert pipeline.stats()["totals"]["like"] == 1
+    assert pipeline.stats()["queued"] == 1
+
+    pipeline._conn.execute("DROP TRIGGER falha")
+    pipeline.flush()
+    assert pipeline._conn.execute("SELECT COUNT(*) FROM feedback_events").fetchone()[0] == 1
+    assert pipeline.stats()["totals"]["like"] == 1
+    assert pipeline.stats()["queued"] == 0
+    pipeline.close()
@@ -0,0 +1,107 @@
+import pytest
+
+from grader import RULE_SETS, Grader
+
+# Para cada tópico com regras: um envio (html, css) que passa e um que reprova
+CASES = {
+    "html_intro": (
+        ("<h1>Título</h1><p>Texto</p>", ""),
+        ("<div>Só um bloco</div>", ""),
+    ),
+    "html_text": (
+        ('<ul><li>Um</li></ul><a href="https://exemplo.com">link</a>', ""),
+        ('<ul><li>Um</li></ul><a href="">link</a>', ""),
+    ),
+    "html_media": (
+        ('<img src="gato.png" alt="">', ""),
+        ('<img src="gato.png">', ""),
+    ),
+    "html_forms": (
+        ('<form><label for="n">Nome</label><input id="n" name="n"><button>Enviar</button></form>', ""),
+        ('<form><input name="n"></form>', ""),
+    ),
+    "css_intro": (
+        ("", "p { color: red; }"),
+        ("<p>sem estilo</p>", ""),
+    ),
+    "css_colors_fonts": (
+        ("", "body { color: #333; font-family: sans-serif; }"),
+        ("", "body { color: #333; }"),
+    ),
+    "css_box_model": (
+        ("", ".caixa { margin: 8px; padding-left: 4px; }"),
+        ("", ".caixa { margin-inline: 8px; padding: 4px; }"),
+    ),
+    "css_flexbox": (
+        ("", ".c { display: flex; justify-content: center; }"),
+        ("", ".c { display: flexible; justify-content: center; }"),
+    ),
+    "css_grid": (
+        ("", ".c { display: grid; grid-template-columns: 1fr 1fr; }"),
+        ("", ".c { display: grid; }"),
+    ),
+    "responsive_design": (
+        ("", "@media (max-width: 600px) { .c { width: 100%; } }"),
+        ("", ".c { width: 100%; }"),
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def grader():
+    return Grader()
+
+
+def test_every_rule_set_has_cases():
+    assert set(CASES) == set(RULE_SETS)
+
+
+@pytest.mark.parametrize("topic", sorted(CASES))
+def test_rule_set_passes_good_submission(grader, topic):
+    code, css = CASES[topic][0]
+    result = grader.grade(topic, code, css)
+    assert result["passed"], result["hints"]
+    assert result["score"] == 1.0
+
+
+@pytest.mark.parametrize("topic", sorted(CASES))
+def test_rule_set_fails_bad_submission(grader, topic):
+    code, css = CASES[topic][1]
+    result = grader.grade(topic, code, css)
+    assert not result["passed"]
+    assert result["hints"]
+
+
+def _check(result, check_id):
+    return next(check for check in result["checks"] if check["id"] == check_id)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("50%", True),
+    ("2rem", True),
+    ("100vw", True),
+    ("1fr 2fr", True),
+    ("320px", False),
+    ("12pxem", False),
+])
+def test_relative_units(grader, value, expected):
+    result = grader.grade("responsive_design", "", f"@media (min-width: 1px) {{ .c {{ width: {value}; }} }}")
+    assert _check(result, "relative_units")["passed"] is expected
+
+
+def test_open_topic_is_not_graded(grader):
+    assert grader.grade("javascript_intro", "<script></script>") is None
+
+
+def test_grade_route_rejects_non_string_code(monkeypatch):
+    pytest.importorskip("flask")
+    import index
+
+    monkeypatch.setattr(index, "GOOGLE_API_KEY", "chave-de-teste")
+    app = index.app.test_client()
+    session_id = app.post("/api/start-session", json={}).get_json()["sessionId"]
+
+    for payload in ({"code": ["<p>"]}, {"code": "<p>oi</p>", "css": {"a": 1}}, {"code": 42}):
+        response = app.post("/api/grade", json={"sessionId": session_id, "currentTopic": "html_intro", **payload})
+        assert response.status_code == 400
+        assert "error" in response.get_json()
@@ -0,0 +1,32 @@
+import pytest
+
+from response_cache import make_key
+
+
+def test_make_key_ignores_case_and_spacing():
+    assert make_key("css_flexbox", "iniciante", "O que é  Flexbox?") == make_key(
+        "css_flexbox", "iniciante", "o que é flexbox"
+    )
+
+
+def test_make_key_changes_with_version():
+    assert make_key("css_flexbox", "iniciante", "oi", version="a") != make_key(
+        "css_flexbox", "iniciante", "oi", version="b"
+    )
+
+
+def test_cache_key_changes_with_model_and_prompt(monkeypatch):
+    pytest.importorskip("flask")
+    import index
+
+    session = {"history": []}
+    before = index.response_cache_key(session, "css_flexbox", "iniciante", "oi")
+    assert before is not None
+
+    monkeypatch.setattr(index, "GEMINI_MODEL_NAME", "outro-modelo")
+    after_model = index.response_cache_key(session, "css_flexbox", "iniciante", "oi")
+    monkeypatch.undo()
+    monkeypatch.setattr(index, "build_prompt_prefix", lambda topic, mode: "Novas instruções.")
+    after_prompt = index.response_cache_key(session, "css_flexbox", "iniciante", "oi")
+
+    assert len({before, after_model, after_prompt}) == 3
@@ -0,0 +1,184 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def turn(text, size=100):
+    return [
+        {"role": "user", "parts": [{"text": text * size}]},
+        {"role": "model", "parts": [{"text": "r" * size}]},
+    ]
+
+
+def test_memory_sessions_expire_after_idle_ttl():
+    clock = FakeClock()
+    store = MemorySessionStore(ttl_seconds=60, clock=clock)
+    store.create("a", "iniciante", "html_intro")
+    store.create("b", "iniciante", "html_intro")
+
+    clock.now += 50
+    assert store.get_scores("a") is not None  # o acesso renova o prazo de "a"
+    clock.now += 20
+    assert store.get("a") is not None
+    assert store.get("b") is None
+    assert store.count() == 1
+
+
+def test_memory_evicts_least_recently_used_when_full():
+    store = MemorySessionStore(max_entries=2, ttl_seconds=0)
+    store.create("a", "iniciante", "html_intro")
+    store.create("b", "iniciante", "html_intro")
+    store.get_state("a")
+    store.create("c", "iniciante", "html_intro")
+
+    assert store.exists("a")
+    assert not store.exists("b")
+    assert store.exists("c")
+
+
+def test_memory_byte_cap_evicts_other_sessions_first():
+    store = MemorySessionStore(ttl_seconds=0, max_bytes=3000)
+    store.create("antiga", "iniciante", "html_intro")
+    store.append_history("antiga", turn("a"))
+    store.create("ativa", "iniciante", "html_intro")
+    for i in range(6):
+        store.append_history("ativa", turn(str(i)))
+
+    assert not store.exists("antiga")
+    assert len(store.get("ativa")["history"]) == 12
+    assert store.stats()["approxBytes"] <= 3000
+
+
+def test_memory_never_evicts_the_active_session():
+    store = MemorySessionStore(ttl_seconds=0, max_bytes=2000)
+    store.create("outra", "iniciante", "html_intro")
+    store.create("ativa", "iniciante", "html_intro")
+    store.update("ativa", summary={"text": "resumo", "covered": 6})
+    for i in range(10):
+        assert store.append_history("ativa", turn(str(i)))
+
+    session = store.get("ativa")
+    assert session is not None
+    # As trocas mais antigas foram descartadas; a última é sempre mantida
+    assert session["history"][-2:] == turn("9")
+    assert len(session["history"]) < 20
+    dropped = 20 - len(session["history"])
+    assert session["summary"]["covered"] == max(0, 6 - dropped)
+    assert store.stats()["approxBytes"] <= 2000
+
+
+def test_memory_keeps_the_last_turn_even_if_it_alone_is_over_the_cap():
+    store = MemorySessionStore(ttl_seconds=0, max_bytes=500)
+    store.create("ativa", "iniciante", "html_intro")
+    store.append_history("ativa", turn("x", size=1000))
+
+    assert store.get("ativa")["history"] == turn("x", size=1000)
+
+
+def _increment_many(path, session_id, count):
+    store = SQLiteSessionStore(path=path)
+    for i in range(count):
+        store.increment_score(session_id, i % 2 == 0)
+
+
+def test_sqlite_increment_score_is_atomic_across_threads(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path=path)
+    store.create("s", "iniciante", "html_intro")
+
+    threads = [threading.Thread(target=_increment_many, args=(path, "s", 25)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.get_scores("s") == {"correct": 8 * 13, "total": 8 * 25}
+
+
+def test_sqlite_increment_score_is_atomic_across_processes(tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("requer o método de início fork")
+    context = multiprocessing.get_context("fork")
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path=path)
+    store.create("s", "iniciante", "html_intro")
+
+    processes = [context.Process(target=_increment_many, args=(path, "s", 25)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    assert store.get_scores("s") == {"correct": 4 * 13, "total": 4 * 25}
+
+
+def test_sqlite_increment_score_on_missing_session_returns_none(tmp_path):
+    store = SQLiteSessionStore(path=str(tmp_path / "sessions.db"))
+    assert store.increment_score("inexistente", True) is None
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_increment_score_keeps_counts_per_topic(backend, tmp_path):
+    if backend == "memory":
+        store = MemorySessionStore()
+    else:
+        store = SQLiteSessionStore(path=str(tmp_path / "sessions.db"))
+    store.create("s", "iniciante", "html_intro")
+
+    store.increment_score("s", False, "html_intro")
+    store.increment_score("s", True, "html_intro")
+    store.increment_score("s", False, "css_intro")
+    scores = store.increment_score("s", True)
+
+    assert scores == {"correct": 2, "total": 4}
+    assert store.get_state("s")["topicScores"] == {
+        "html_intro": {"correct": 1, "total": 2},
+        "css_intro": {"correct": 0, "total": 1},
+    }
+
+
+def _last_access(store, session_id):
+    return store._conn().execute("SELECT last_access FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+
+
+def test_sqlite_reads_refresh_last_access_only_when_stale(tmp_path):
+    clock = FakeClock()
+    store = SQLiteSessionStore(path=str(tmp_path / "sessions.db"), ttl_seconds=300, clock=clock)
+    store.create("s", "iniciante", "html_intro")
+
+    clock.now += store.TOUCH_INTERVAL_SECONDS - 1
+    assert store.get("s") is not None
+    assert store.get_state("s") is not None
+    assert store.get_scores("s") is not None
+    assert _last_access(store, "s") == 1000.0
+
+    clock.now += 2
+    assert store.get_scores("s") is not None
+    assert _last_access(store, "s") == clock.now
+
+
+def test_sqlite_reads_keep_session_alive_and_expire_it_after_ttl(tmp_path):
+    clock = FakeClock()
+    store = SQLiteSessionStore(path=str(tmp_path / "sessions.db"), ttl_seconds=300, clock=clock)
+    store.create("s", "iniciante", "html_intro")
+
+    for _ in range(5):
+        clock.now += 200
+        assert store.get_state("s") is not None
+
+    clock.now += 301
+    assert store.get("s") is None
+    assert store.get_state("s") is None
+    assert store.get_scores("s") is None
@@ -0,0 +1,96 @@
+import pytest
+
+from topic_graph import REVIEW_MIN_EXERCISES, TopicGraph, TopicGraphError, load_topic_graph
+
+
+def topic(name, next_topics=None):
+    return {"name": name, "description": f"Sobre {name}", "next_topics": next_topics}
+
+
+def small_graph():
+    # a -> b -> d, a -> c -> d (c declarado antes de b)
+    return TopicGraph({
+        "a": topic("A", ["c", "b"]),
+        "c": topic("C", ["d"]),
+        "b": topic("B", ["d"]),
+        "d": topic("D"),
+    })
+
+
+def test_real_topics_file_loads():
+    graph = load_topic_graph()
+    assert graph.roots == ("html_intro",)
+    assert graph.order[-1] == "html_css_project"
+
+
+def test_next_follows_topological_order():
+    graph = small_graph()
+    assert graph.order == ["a", "c", "b", "d"]
+    assert [graph.topics[key]["next"] for key in graph.order] == ["c", "b", "d", None]
+    assert graph.topics["d"]["prerequisites"] == ["c", "b"]
+
+
+@pytest.mark.parametrize("raw, message", [
+    ({}, "não vazio"),
+    ({"a": topic("A", ["x"])}, "inexistente"),
+    ({"a": topic("A", ["a"])}, "si mesmo"),
+    ({"a": topic("A", ["b"]), "b": topic("B", ["a"])}, "Ciclo"),
+    ({"a": {"name": "A"}}, "description"),
+])
+def test_invalid_graphs_are_rejected(raw, message):
+    with pytest.raises(TopicGraphError, match=message):
+        TopicGraph(raw)
+
+
+def test_recommend_advances_with_ready_topics_first():
+    graph = TopicGraph({
+        "a": topic("A", ["b", "c"]),
+        "b": topic("B", ["d"]),
+        "c": topic("C", ["d"]),
+        "d": topic("D"),
+    })
+    result = graph.recommend("b")
+    assert result["action"] == "advance"
+    assert [entry["topic"] for entry in result["recommendations"]] == ["d"]
+    assert result["recommendations"][0]["missingPrerequisites"] == ["c"]
+
+
+def test_recommend_reviews_after_low_accuracy_on_the_topic():
+    graph = small_graph()
+    result = graph.recommend("d", {"correct": 0, "total": REVIEW_MIN_EXERCISES})
+    assert result["action"] == "review"
+    assert [entry["topic"] for entry in result["recommendations"]] == ["d", "c", "b"]
+
+
+def test_recommend_needs_enough_exercises_before_review():
+    graph = small_graph()
+    assert graph.recommend("a", {"correct": 0, "total": REVIEW_MIN_EXERCISES - 1})["action"] == "advance"
+
+
+def test_recommend_completed_and_unknown_topic():
+    graph = small_graph()
+    assert graph.recommend("d")["action"] == "completed"
+    assert graph.recommend("inexistente")["currentTopic"] == "a"
+
+
+def test_next_topics_reviews_only_on_the_current_topic_score(monkeypatch):
+    pytest.importorskip("flask")
+    import index
+
+    monkeypatch.setattr(index, "GOOGLE_API_KEY", "chave-de-teste")
+    app = index.app.test_client()
+    session_id = app.post("/api/start-session", json={}).get_json()["sessionId"]
+    for _ in range(3):
+        response = app.post(
+            "/api/exercise-evaluation",
+            json={"sessionId": session_id, "isCorrect": False, "currentTopic": "html_intro"},
+        )
+        assert response.status_code == 200
+
+    other = app.get(f"/api/next-topics?sessionId={session_id}&currentTopic=css_intro").get_json()
+    assert other["action"] == "advance"
+    assert other["accuracy"] is None
+
+    same = app.get(f"/api/next-topics?sessionId={session_id}&currentTopic=html_intro").get_json()
+    assert same["action"] == "review"
+    assert same["accuracy"] == 0
@@ -0,0 +1,337 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.api_core import exceptions
+
+from upstream import GeminiClient, UpstreamIncomplete, UpstreamSaturated, UpstreamTimeout
+
+
+class FakeModel:
+    """Modelo mínimo com a interface usada pelo GeminiClient.
+
+    `steps` é consumido uma entrada por chamada: uma exceção é levantada,
+    qualquer outro valor (ou a lista vazia) gera uma resposta normal. Com
+    `gate`, cada chamada espera o evento antes de responder.
+    """
+
+    def __init__(self, steps=(), gate=None):
+        self.steps = list(steps)
+        self.gate = gate
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def start_chat(self, history=None):
+        return self
+
+    def send_message(self, prompt, stream=False, request_options=None):
+        text = self._respond(prompt, request_options)
+        if stream:
+            return [SimpleNamespace(text=part) for part in text.split()]
+        return SimpleNamespace(text=text)
+
+    def generate_content(self, prompt, request_options=None):
+        return SimpleNamespace(text=self._respond(prompt, request_options))
+
+    def _respond(self, prompt, request_options):
+        with self._lock:
+            self.calls += 1
+            self.timeouts.append((request_options or {}).get("timeout"))
+            step = self.steps.pop(0) if self.steps else None
+        if self.gate is not None:
+            self.gate.wait(5)
+        if isinstance(step, Exception):
+            raise step
+        return f"resposta para {prompt}"
+
+
+def make_client(model, **kwargs):
+    kwargs.setdefault("backoff_base", 0)
+    kwargs.setdefault("timeout", 5)
+    return GeminiClient(lambda: model, **kwargs)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condição não atingida a tempo")
+        time.sleep(0.005)
+
+
+def run_in_thread(fn, *args):
+    result = {}
+
+    def target():
+        try:
+            result["value"] = fn(*args)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, result
+
+
+def test_rejects_when_slots_and_queue_are_full():
+    gate = threading.Event()
+    client = make_client(FakeModel(gate=gate), max_concurrency=1, max_queue=0)
+    thread, result = run_in_thread(client.send_message, [], "primeira")
+    wait_until(lambda: client.stats()["pending"] == 1)
+
+    with pytest.raises(UpstreamSaturated):
+        client.send_message([], "segunda")
+    with pytest.raises(UpstreamSaturated):
+        client.stream_message([], "terceira")
+
+    gate.set()
+    thread.join()
+    assert result["value"] == "resposta para primeira"
+    assert client.stats()["rejected"] == 2
+    assert client.stats()["pending"] == 0
+
+
+def test_identical_prompts_share_one_call():
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    client = make_client(model)
+    first, first_result = run_in_thread(client.send_message, [], "igual")
+    wait_until(lambda: model.calls == 1)
+    second, second_result = run_in_thread(client.send_message, [], "igual")
+    wait_until(lambda: client.stats()["coalesced"] == 1)
+
+    gate.set()
+    first.join()
+    second.join()
+    assert first_result["value"] == second_result["value"] == "resposta para igual"
+    assert model.calls == 1
+    assert client.stats()["inflightUnique"] == 0
+
+
+def test_retries_rate_limit_and_unavailable_errors():
+    model = FakeModel(steps=[exceptions.TooManyRequests("429"), exceptions.ServiceUnavailable("503")])
+    client = make_client(model, max_retries=2)
+
+    assert client.generate("resumo") == "resposta para resumo"
+    assert model.calls == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_gives_up_after_max_retries():
+    model = FakeModel(steps=[exceptions.TooManyRequests("429")] * 3)
+    client = make_client(model, max_retries=1)
+
+    with pytest.raises(exceptions.TooManyRequests):
+        client.send_message([], "oi")
+    assert model.calls == 2
+
+
+def test_does_not_retry_other_errors():
+    model = FakeModel(steps=[exceptions.InternalServerError("500")])
+    client = make_client(model, max_retries=2)
+
+    with pytest.raises(exceptions.InternalServerError):
+        client.send_message([], "oi")
+    assert model.calls == 1
+
+
+def test_timeout_passes_deadline_to_sdk_and_drops_inflight_call():
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    client = make_client(model, timeout=0.2)
+
+    with pytest.raises(UpstreamTimeout):
+        client.send_message([], "lenta")
+    assert 0 < model.timeouts[0] <= 0.2
+    stats = client.stats()
+    assert stats["timeouts"] == 1
+    # Um prompt idêntico depois do timeout inicia uma nova chamada
+    assert stats["inflightUnique"] == 0
+
+    gate.set()
+    assert client.send_message([], "lenta") == "resposta para lenta"
+    assert model.calls == 2
+
+
+def test_sdk_deadline_becomes_upstream_timeout():
+    model = FakeModel(steps=[exceptions.DeadlineExceeded("prazo esgotado")])
+    client = make_client(model)
+
+    with pytest.raises(UpstreamTimeout):
+        client.send_message([], "oi")
+    assert client.stats()["timeouts"] == 1
+
+
+def test_stream_releases_admission_when_closed_unread():
+    client = make_client(FakeModel(), max_concurrency=1, max_queue=0)
+    stream = client.stream_message([], "um dois")
+    assert client.stats()["pending"] == 1
+
+    stream.close()
+    stream.close()
+    assert client.stats()["pending"] == 0
+    assert list(client.stream_message([], "um dois")) == ["resposta", "para", "um", "dois"]
+    assert client.stats()["pending"] == 0
+
+
+def test_chat_routes_return_503_when_saturated(monkeypatch):
+    pytest.importorskip("flask")
+    import index
+
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    client = make_client(model, max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(index, "GOOGLE_API_KEY", "chave-de-teste")
+    monkeypatch.setattr(index, "gemini_model", model)
+    monkeypatch.setattr(index, "upstream_client", client)
+    monkeypatch.setattr(index, "response_cache", None)
+
+    app = index.app.test_client()
+    session_id = app.post("/api/start-session", json={}).get_json()["sessionId"]
+    thread, _ = run_in_thread(client.send_message, [], "ocupando a vaga")
+    wait_until(lambda: client.stats()["pending"] == 1)
+
+    payload = {"sessionId": session_id, "message": "oi", "currentTopic": "css_flexbox", "currentMode": "iniciante"}
+    assert app.post("/api/chat", json=payload).status_code == 503
+    assert app.post("/api/chat/stream", json=payload).status_code == 503
+
+    gate.set()
+    thread.join()
+
+
+def stream_chunk(text, reason=None):
+    candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name=reason))] if reason else []
+    chunk = SimpleNamespace(candidates=candidates)
+    if text is not None:
+        chunk.text = text
+    return chunk
+
+
+class EndsWithModel(FakeModel):
+    """Stream de dois trechos com texto seguidos de um trecho final sem texto."""
+
+    def __init__(self, reason):
+        super().__init__()
+        self.reason = reason
+
+    def send_message(self, prompt, stream=False, request_options=None):
+        final = stream_chunk(None, self.reason)
+        return [stream_chunk("Olá, "), stream_chunk("flexbox é"), NoTextChunk(final)]
+
+
+class NoTextChunk:
+    """Trecho final como o do SDK: .text levanta ValueError quando não há partes."""
+
+    def __init__(self, chunk):
+        self.candidates = chunk.candidates
+
+    @property
+    def text(self):
+        raise ValueError("sem texto")
+
+
+@pytest.mark.parametrize("reason", ["SAFETY", "RECITATION"])
+def test_stream_cut_short_raises_incomplete(reason):
+    client = make_client(EndsWithModel(reason))
+    received = []
+
+    with pytest.raises(UpstreamIncomplete) as excinfo:
+        for text in client.stream_message([], "oi"):
+            received.append(text)
+    assert excinfo.value.reason == reason
+    assert received == ["Olá, ", "flexbox é"]
+    assert client.stats()["pending"] == 0
+
+
+@pytest.mark.parametrize("reason", ["STOP", "MAX_TOKENS"])
+def test_stream_with_normal_finish_completes(reason):
+    client = make_client(EndsWithModel(reason))
+    assert "".join(client.stream_message([], "oi")) == "Olá, flexbox é"
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, text):
+        self.entries[key] = text
+
+
+def test_stream_route_does_not_save_or_cache_cut_reply(monkeypatch):
+    pytest.importorskip("flask")
+    import index
+
+    model = EndsWithModel("SAFETY")
+    cache = DictCache()
+    monkeypatch.setattr(index, "GOOGLE_API_KEY", "chave-de-teste")
+    monkeypatch.setattr(index, "gemini_model", model)
+    monkeypatch.setattr(index, "upstream_client", make_client(model))
+    monkeypatch.setattr(index, "response_cache", cache)
+
+    app = index.app.test_client()
+    session_id = app.post("/api/start-session", json={}).get_json()["sessionId"]
+    payload = {"sessionId": session_id, "message": "oi", "currentTopic": "css_flexbox", "currentMode": "iniciante"}
+    body = app.post("/api/chat/stream", json=payload).get_data(as_text=True)
+
+    assert "event: error" in body and "event: done" not in body
+    assert '"partial": "Olá, flexbox é"' in body
+    assert cache.entries == {}
+    assert index.session_store.get(session_id)["history"] == []
+
+
+def test_chat_route_errors_are_logged_as_json(monkeypatch, capsys):
+    pytest.importorskip("flask")
+    import json
+
+    import index
+
+    class BrokenClient:
+        def send_message(self, history, prompt):
+            raise RuntimeError("falhou")
+
+    monkeypatch.setattr(index, "GOOGLE_API_KEY", "chave-de-teste")
+    monkeypatch.setattr(index, "gemini_model", FakeModel())
+    monkeypatch.setattr(index, "upstream_client", BrokenClient())
+    monkeypatch.setattr(index, "response_cache", None)
+
+    app = index.app.test_client()
+    session_id = app.post("/api/start-session", json={}).get_json()["sessionId"]
+    payload = {"sessionId": session_id, "message": "oi", "currentTopic": "css_flexbox", "currentMode": "iniciante"}
+    assert app.post("/api/chat", json=payload).status_code == 500
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    errors = [r for r in records if r["event"] == "route_error"]
+    assert len(errors) == 1
+    assert errors[0]["level"] == "error"
+    assert errors[0]["exception"] == "RuntimeError"
+    assert errors[0]["route"] == "/api/chat"
+    assert "RuntimeError: falhou" in errors[0]["traceback"]
+    assert errors[0]["requestId"]
+
+
+def test_chat_cache_hit_does_not_load_the_model(monkeypatch):
+    pytest.importorskip("flask")
+    import index
+
+    loads = []
+    cache = DictCache()
+    monkeypatch.setattr(index, "GOOGLE_API_KEY", "chave-de-teste")
+    monkeypatch.setattr(index, "get_gemini_model", lambda: loads.append(1))
+    monkeypatch.setattr(index, "response_cache", cache)
+
+    app = index.app.test_client()
+    session_id = app.post("/api/start-session", json={}).get_json()["sessionId"]
+    key = index.response_cache_key({"history": []}, "css_flexbox", "iniciante", "oi")
+    cache.put(key, "resposta guardada")
+
+    payload = {"sessionId": session_id, "message": "oi", "currentTopic": "css_flexbox", "currentMode": "iniciante"}
+    body = app.post("/api/chat", json=payload).get_json()
+
+    assert body["response"] == "resposta guardada" and body["cached"] is True
+    assert loads == []
+    assert len(index.session_store.get(session_id)["history"]) == 2